@@ -6,150 +6,2547 @@ USAGE:
     python HallAnalogMapper.py          # Full UI
     python HallAnalogMapper.py --noui   # Headless (minimal overhead)
 """
-import customtkinter as ctk
-import tkinter as tk
-from tkinter import messagebox, simpledialog
-import hid
-import vgamepad as vg
+import atexit
 import threading
 import time
+import collections
+import itertools
 import json
+import math
+import mmap
 import os
+import struct
 import sys
-from dataclasses import dataclass
+from array import array
 from typing import Dict
 
+LAUNCH_NS = time.perf_counter_ns()  # startup reference for time-to-first-output
+ready_ms = 0.0  # launch -> first session started by a front end (report_ready)
+
+# Heavy dependencies are imported on first use: headless mode never loads
+# Tk/customtkinter, and replay/synthetic runs never load hidapi or ViGEm.
+ctk = tk = messagebox = simpledialog = None
+hid = None
+vg = None
+
+
+def load_gui():
+    """Import customtkinter/tkinter (GUI front end only)."""
+    global ctk, tk, messagebox, simpledialog
+    if ctk is None:
+        import customtkinter as ctk
+        import tkinter as tk
+        from tkinter import messagebox, simpledialog
+
+
+def load_hid():
+    """The hidapi module, imported on first use; None if it is not installed."""
+    global hid
+    if hid is None:
+        try:
+            import hid
+        except ImportError:  # replay/synthetic sources run without hidapi
+            return None
+    return hid
+
+
+def require_hid():
+    """load_hid() for code that needs real devices; RuntimeError if hidapi is missing."""
+    if load_hid() is None:
+        raise RuntimeError("hidapi is not installed")
+    return hid
+
+
+def load_vgamepad():
+    """The vgamepad module, imported on first use; None if it is not installed."""
+    global vg
+    if vg is None:
+        try:
+            import vgamepad as vg
+        except ImportError:  # null/record sinks run without ViGEm
+            return None
+    return vg
+
+
 CONFIG_FILE = "hall_config.json"
 LEGACY_CONFIG_FILE = "mchose_config.json"
+PROBE_CACHE_FILE = "hall_probe_cache.json"  # probe results, next to hall_config.json
+CONFIG_DEBOUNCE = 0.5  # s without changes before the config is written
+CONFIG_POLL = 0.5  # s between checks of hall_config.json for outside edits
+UI_FPS = 60  # GUI frames per second (--ui-fps); the Tk thread polls engine state
+REPORT_HEADER = 0xA0
+MAX_BATCH = 256  # reports drained per wakeup in --batch mode
+# Device auto-detection: probes in parallel, each samples reports for a short window
+PROBE_WORKERS = 8
+PROBE_WINDOW_MS = 150
+PROBE_TIMEOUT = 1.0  # s per device on top of the window (open_path can hang)
+READER_MODES = ("spin", "block")
+READ_TIMEOUT_MS = 100  # --reader block: kernel wait per read, bounds shutdown latency
+# Capture files (--record / --replay): magic, then (perf_counter_ns, 64-byte report) records
+CAPTURE_MAGIC = b"HALLREC\x01"
+CAPTURE_RECORD = struct.Struct("<Q64s")
+CAPTURE_SESSION = 0  # stamp of the record that starts each session appended to a capture
+# Output recordings (--sink record): magic, then (perf_counter_ns, lt, rt, lx, ly, rx, ry) records
+OUTPUT_MAGIC = b"HALLOUT\x01"
+OUTPUT_RECORD = struct.Struct("<QBBhhhh")
+SINKS = ("vigem", "null", "record")
+# Optional smoothing stage of SignalProcessor (settings "filter", "filter_cutoff" Hz, "filter_beta")
+FILTERS = ("none", "ema", "oneeuro")
+FILTER_D_CUTOFF = 1.0  # One Euro: cutoff (Hz) of the speed estimate
+# Keyboards report only on change: a held key's filter keeps stepping every FILTER_STEP_MS
+# from the reader until it is within FILTER_SETTLE_EPS of the target (below one stick step)
+FILTER_STEP_MS = 1
+FILTER_SETTLE_EPS = 1e-5
+# Output scheduling: micro-interpolated on the pad thread, emitted straight from the reader,
+# or one coalesced update per tick of a fixed-rate pad thread (--output-rate HZ)
+OUTPUT_MODES = ("interpolated", "direct", "fixed")
+OUTPUT_RATE = 1000
+
+# --- MAPA DE TECLAS ---
+HID_MAP = {
+    0x29: "ESC", 0x3A: "F1", 0x3B: "F2", 0x3C: "F3", 0x3D: "F4", 0x3E: "F5", 0x3F: "F6", 0x40: "F7", 0x41: "F8", 0x42: "F9", 0x43: "F10", 0x44: "F11", 0x45: "F12",
+    0x35: "`", 0x1E: "1", 0x1F: "2", 0x20: "3", 0x21: "4", 0x22: "5", 0x23: "6", 0x24: "7", 0x25: "8", 0x26: "9", 0x27: "0", 0x2D: "-", 0x2E: "=", 0x2A: "BACK",
+    0x2B: "TAB", 0x14: "Q", 0x1A: "W", 0x08: "E", 0x15: "R", 0x17: "T", 0x1C: "Y", 0x18: "U", 0x0C: "I", 0x12: "O", 0x13: "P", 0x2F: "[", 0x30: "]", 0x31: "\\",
+    0x39: "CAPS", 0x04: "A", 0x16: "S", 0x07: "D", 0x09: "F", 0x0A: "G", 0x0B: "H", 0x0D: "J", 0x0E: "K", 0x0F: "L", 0x33: ";", 0x34: "'", 0x28: "ENTER",
+    0xE1: "LSHFT", 0x1D: "Z", 0x1B: "X", 0x06: "C", 0x19: "V", 0x05: "B", 0x11: "N", 0x10: "M", 0x36: ",", 0x37: ".", 0x38: "/", 0xE5: "RSHFT",
+    0xE0: "CTRL", 0xE2: "WIN", 0xE3: "ALT", 0x2C: "SPACE", 0xE6: "RALT", 0xE7: "FN", 0x65: "MENU", 0xE4: "RCTRL"
+}
+NAME_TO_HID = {v: k for k, v in HID_MAP.items()}
+# Keys driven by SyntheticSource, most commonly mapped first
+SYNTHETIC_KEYS = [NAME_TO_HID[k] for k in (
+    "W", "A", "S", "D", "Q", "E", "I", "J", "K", "L", "SPACE", "LSHFT",
+    "R", "F", "Z", "X", "C", "V", "U", "O", "H", "G", "T", "Y",
+    "1", "2", "3", "4", "5", "6", "7", "8",
+)]
+
+CONTROLLER_ACTIONS = [
+    "None",
+    "Right Trigger (RT) - Accelerate",
+    "Left Trigger (LT) - Brake",
+    "Left Stick: UP (Y+)",
+    "Left Stick: DOWN (Y-)",
+    "Left Stick: LEFT (X-)",
+    "Left Stick: RIGHT (X+)",
+    "Right Stick: UP",
+    "Right Stick: DOWN",
+    "Right Stick: LEFT",
+    "Right Stick: RIGHT",
+    "Button A", "Button B", "Button X", "Button Y"
+]
+# Virtual pads (XInput sees at most 4); mappings target pad N with a "Pad N: " prefix
+MAX_PADS = 4
+
+LEGACY_TO_ENGLISH = {
+    "Ninguna": "None",
+    "Gatillo Derecho (RT) - Acelerar": "Right Trigger (RT) - Accelerate",
+    "Gatillo Izquierdo (LT) - Frenar": "Left Trigger (LT) - Brake",
+    "Stick Izquierdo: ARRIBA (Y+)": "Left Stick: UP (Y+)",
+    "Stick Izquierdo: ABAJO (Y-)": "Left Stick: DOWN (Y-)",
+    "Stick Izquierdo: IZQUIERDA (X-)": "Left Stick: LEFT (X-)",
+    "Stick Izquierdo: DERECHA (X+)": "Left Stick: RIGHT (X+)",
+    "Stick Derecho: ARRIBA": "Right Stick: UP",
+    "Stick Derecho: ABAJO": "Right Stick: DOWN",
+    "Stick Derecho: IZQUIERDA": "Right Stick: LEFT",
+    "Stick Derecho: DERECHA": "Right Stick: RIGHT",
+    "Bot?n A": "Button A",
+    "Bot?n B": "Button B",
+    "Bot?n X": "Button X",
+    "Bot?n Y": "Button Y",
+}
+
+
+def cli_value(name: str, default: str) -> str:
+    """Value of '--name=value' or '--name value' from sys.argv."""
+    for i, arg in enumerate(sys.argv):
+        if arg.startswith(name + "="):
+            return arg.split("=", 1)[1]
+        if arg == name and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return default
+
+
+def reader_mode_from_cli() -> str:
+    mode = cli_value("--reader", "spin")
+    if mode not in READER_MODES:
+        print(f"Unknown reader mode '{mode}', using spin")
+        mode = "spin"
+    return mode
+
+
+def translate_actions(mapping: Dict[str, str]) -> Dict[str, str]:
+    """Map legacy Spanish action labels to English equivalents."""
+    return {k: LEGACY_TO_ENGLISH.get(v, v) for k, v in mapping.items()}
+
+
+# Axis slots of the compiled mapping table (and of every axis list/array)
+AXIS_LX, AXIS_LY, AXIS_RX, AXIS_RY, AXIS_LT, AXIS_RT = range(6)
+AXIS_NAMES = ("lx", "ly", "rx", "ry", "lt", "rt")
+AXIS_SLOTS = tuple(range(len(AXIS_NAMES)))
+ZERO_AXES = (0.0,) * len(AXIS_NAMES)
+
+
+def action_to_axis(action: str):
+    """Resolve an action label to (axis slot, sign); None if it drives no axis."""
+    if "Right Trigger" in action:
+        return (AXIS_RT, 1)
+    if "Left Trigger" in action:
+        return (AXIS_LT, 1)
+    if "Left Stick" in action:
+        if "UP" in action:
+            return (AXIS_LY, 1)
+        if "DOWN" in action:
+            return (AXIS_LY, -1)
+        if "RIGHT" in action:
+            return (AXIS_LX, 1)
+        if "LEFT" in action:
+            return (AXIS_LX, -1)
+    if "Right Stick" in action:
+        if "UP" in action:
+            return (AXIS_RY, 1)
+        if "DOWN" in action:
+            return (AXIS_RY, -1)
+        if "RIGHT" in action:
+            return (AXIS_RX, 1)
+        if "LEFT" in action:
+            return (AXIS_RX, -1)
+    return None
+
+
+def split_pad_action(action: str):
+    """"Pad 3: Button A" -> (2, "Button A"); no prefix is pad 0."""
+    if action.startswith("Pad ") and ": " in action:
+        head, rest = action.split(": ", 1)
+        try:
+            pad = int(head[4:]) - 1
+        except ValueError:
+            return 0, action
+        return min(max(pad, 0), MAX_PADS - 1), rest
+    return 0, action
+
+
+def pad_action(pad: int, action: str) -> str:
+    """Inverse of split_pad_action (pad 0 keeps the plain label)."""
+    return action if pad <= 0 or action == "None" else f"Pad {pad + 1}: {action}"
+
+
+def mapping_pads(mappings: Dict[str, str]) -> int:
+    """Number of pads the mappings need (highest pad index + 1)."""
+    return 1 + max((split_pad_action(a)[0] for a in mappings.values()), default=0)
+
+
+def compile_mappings(mappings: Dict[str, str]) -> list:
+    """
+    Compile {"<hid code>": action} into a 256-entry table indexed by HID code.
+    Each entry is None or (axis slot, sign), so the hot path does no string work.
+    Pad N's axes are slots N * 6 .. N * 6 + 5.
+    """
+    table = [None] * 256
+    for ks, action in mappings.items():
+        try:
+            code = int(ks)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= code < 256:
+            pad, label = split_pad_action(action)
+            entry = action_to_axis(label)
+            if entry:
+                entry = (pad * len(AXIS_NAMES) + entry[0], entry[1])
+            table[code] = entry
+    return table
+
+
+# ============================================================================
+# PROCESAMIENTO DIRECTO - Sin filtros que a?adan latencia
+# ============================================================================
+class KeyStateStore:
+    """
+    Estado de las 256 teclas HID en arrays preasignados (struct-of-arrays).
+    Sin dicts ni objetos nuevos en el hot path; 'active' es un bitset de 256 bits.
+    """
+    __slots__ = ("raw", "filtered", "active", "count")
+
+    def __init__(self):
+        self.raw = array("l", [0]) * 256
+        self.filtered = array("d", [0.0]) * 256
+        self.active = bytearray(32)
+        self.count = 0
+
+    def is_active(self, key: int) -> bool:
+        return bool(self.active[key >> 3] & (1 << (key & 7)))
+
+    @staticmethod
+    def bit_codes(bits) -> list:
+        """Codigos con su bit a 1 en un bitset de 256 bits, en orden ascendente."""
+        codes = []
+        for i, byte in enumerate(bits):
+            while byte:
+                low = byte & -byte
+                codes.append((i << 3) + low.bit_length() - 1)
+                byte ^= low
+        return codes
+
+    def active_codes(self) -> list:
+        """Codigos HID activos, en orden ascendente."""
+        return self.bit_codes(self.active)
+
+    def held(self) -> list:
+        """[(codigo, filtered)] de las teclas activas."""
+        filtered = self.filtered
+        return [(code, filtered[code]) for code in self.active_codes()]
+
+    def reset(self):
+        self.raw[:] = array("l", [0]) * 256
+        self.filtered[:] = array("d", [0.0]) * 256
+        self.active[:] = bytes(32)
+        self.count = 0
+
+
+class KeyState:
+    """Vista de una tecla sobre KeyStateStore (compatibilidad con get_state)."""
+    __slots__ = ("_store", "key")
+
+    def __init__(self, store: KeyStateStore, key: int):
+        self._store = store
+        self.key = key
+
+    @property
+    def raw(self) -> int:
+        return self._store.raw[self.key]
+
+    @raw.setter
+    def raw(self, value: int):
+        self._store.raw[self.key] = value
+
+    @property
+    def filtered(self) -> float:
+        return self._store.filtered[self.key]
+
+    @filtered.setter
+    def filtered(self, value: float):
+        self._store.filtered[self.key] = value
+
+    @property
+    def active(self) -> bool:
+        return self._store.is_active(self.key)
+
+
+class ProcessorConfig:
+    """
+    Ajustes compilados del procesador: curva (LUT) y filtro juntos. Inmutable:
+    un cambio crea otro ProcessorConfig (ver replace) que se instala con una
+    sola asignacion, asi cada paquete ve o la configuracion vieja o la nueva,
+    nunca una mezcla.
+    """
+    __slots__ = ("deadzone", "sensitivity", "max_pressure", "curve",
+                 "filter", "filter_cutoff", "filter_beta", "lut")
+    CURVE_FIELDS = ("deadzone", "sensitivity", "max_pressure", "curve")
+
+    def __init__(self, deadzone=30, sensitivity=1.0, max_pressure=600, curve: str = "linear",
+                 filter: str = "none", filter_cutoff: float = 5.0, filter_beta: float = 1.0, lut=None):
+        self.deadzone = deadzone
+        self.sensitivity = sensitivity
+        self.max_pressure = max_pressure
+        self.curve = curve
+        self.filter = filter if filter in FILTERS else "none"
+        self.filter_cutoff = max(0.01, float(filter_cutoff))
+        self.filter_beta = max(0.0, float(filter_beta))
+        # raw -> salida final; el ultimo elemento es la cola saturada
+        self.lut = lut if lut is not None else self.build_lut()
+
+    def replace(self, **changes) -> "ProcessorConfig":
+        """Copia con cambios; la LUT se reutiliza si la curva no cambio."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        if any(changes.get(name, fields[name]) != fields[name] for name in self.CURVE_FIELDS):
+            fields["lut"] = None
+        fields.update(changes)
+        return ProcessorConfig(**fields)
+
+    def build_lut(self) -> array:
+        """
+        Precalcula la salida para cada raw posible hasta saturar. Todo raw por
+        encima de max_pressure (y de la deadzone) da el mismo valor que el ultimo.
+        """
+        top = max(int(math.ceil(self.max_pressure)), int(self.deadzone) + 1, 1)
+        return array("d", [self.compute(raw) for raw in range(top + 1)])
+
+    def compute(self, raw: int) -> float:
+        """
+        Procesamiento DIRECTO sin filtros:
+        1. Aplica deadzone
+        2. Normaliza [0, 1]
+        3. Aplica curva
+        4. Retorna inmediatamente
+        """
+        # Deadzone (opcional). Por defecto 0 para m?ximo recorrido.
+        if raw <= self.deadzone:
+            return 0.0
+
+        # Normalizar directo al rango completo (0..max_pressure)
+        # Permite valores mayores a max_pressure pero se saturan al 100%.
+        norm = raw / self.max_pressure if self.max_pressure > 0 else 1.0
+        norm = min(1.0, max(0.0, norm))
+        
+        # Curva de respuesta
+        curved = self.apply_curve(norm)
+        
+        # Sensibilidad
+        return min(1.0, curved * self.sensitivity)
+    
+    def apply_curve(self, x: float) -> float:
+        if self.curve == "linear":
+            return x
+        elif self.curve == "exponential":
+            return x * x
+        elif self.curve == "scurve":
+            return 3*x*x - 2*x*x*x
+        elif self.curve == "fast":
+            return 1 - (1-x)*(1-x)
+        elif self.curve == "aggressive":
+            return min(1.0, x * 1.5) if x < 0.7 else 1.0
+        return x
+
+
+class SignalProcessor:
+    """Procesador de se?ales DIRECTO - m?nima latencia."""
+    
+    def __init__(self):
+        self.store = KeyStateStore()
+        # Ajustes vigentes; se reemplazan enteros (use), nunca se modifican
+        self.config = ProcessorConfig()
+        # Estado por tecla del filtro opcional tras la LUT (ver smooth)
+        self.f_value = array("d", [0.0]) * 256
+        self.f_slope = array("d", [0.0]) * 256
+        self.f_time = array("q", [0]) * 256  # ns de la ultima muestra, 0 = sin historia
+        self.f_target = array("d", [0.0]) * 256  # salida sin filtrar de la ultima muestra
+        # Estado previo al ultimo paso de cada tecla (ver rewind)
+        self.f_undo_value = array("d", [0.0]) * 256
+        self.f_undo_slope = array("d", [0.0]) * 256
+        self.f_undo_time = array("q", [0]) * 256
+        self.f_undo_target = array("d", [0.0]) * 256
+        # Teclas cuyo filtro aun no llego al objetivo (ver settle) y su marca
+        self.settling = []
+        self._settling = bytearray(256)
+
+    def use(self, config: ProcessorConfig):
+        """Instala config con una sola asignacion (seguro con el lector corriendo)."""
+        if config.filter != self.config.filter:
+            self.f_time[:] = array("q", [0]) * 256
+        self.config = config
+
+    def configure(self, deadzone, sensitivity, max_pressure, curve: str):
+        """Aplica settings; la LUT solo se reconstruye si algo cambio."""
+        self.use(self.config.replace(deadzone=deadzone, sensitivity=sensitivity,
+                                     max_pressure=max_pressure, curve=curve))
+
+    def configure_filter(self, kind: str, cutoff: float, beta: float):
+        """Selecciona el filtro ('none' lo desactiva) y sus parametros."""
+        self.use(self.config.replace(filter=kind, filter_cutoff=cutoff, filter_beta=beta))
+
+    def get_state(self, key: int) -> KeyState:
+        return KeyState(self.store, key)
+    
+    def process(self, key: int, raw: int, now: int = 0) -> float:
+        """
+        Una sola lectura indexada en la LUT (ver ProcessorConfig.compute), y el filtro si hay
+        uno activo (now = perf_counter_ns de la muestra; 0 = ahora). Actualiza
+        raw, filtered y el bit de tecla activa (salida > 0) en el store.
+        """
+        config = self.config  # una sola lectura: todo el paquete usa los mismos ajustes
+        lut = config.lut
+        try:
+            final = lut[raw]
+        except IndexError:
+            final = lut[-1]
+
+        if config.filter != "none":
+            self.f_undo_value[key] = self.f_value[key]
+            self.f_undo_slope[key] = self.f_slope[key]
+            self.f_undo_time[key] = self.f_time[key]
+            self.f_undo_target[key] = self.f_target[key]
+            if final > 0.0:
+                target = self.f_target[key] = final
+                final = self.smooth(key, final, now or time.perf_counter_ns(), config)
+                if abs(final - target) <= FILTER_SETTLE_EPS:
+                    final = self.f_value[key] = target
+                elif not self._settling[key]:
+                    self._settling[key] = 1
+                    self.settling.append(key)
+            else:
+                self.f_time[key] = 0  # soltar no se filtra
+
+        store = self.store
+        bit = 1 << (key & 7)
+        if final > 0.0:
+            store.raw[key] = raw
+            store.filtered[key] = final
+            if not store.active[key >> 3] & bit:
+                store.active[key >> 3] |= bit
+                store.count += 1
+        else:
+            store.raw[key] = 0
+            store.filtered[key] = 0.0
+            if store.active[key >> 3] & bit:
+                store.active[key >> 3] &= ~bit & 0xFF
+                store.count -= 1
+        return final
+
+    def smooth(self, key: int, x: float, now: int, config: ProcessorConfig = None) -> float:
+        """
+        Paso bajo de primer orden por tecla, dependiente de dt (muestras
+        irregulares o lotes no cambian la respuesta en tiempo).
+        Parametros de config (por defecto self.config):
+        - ema: corte fijo filter_cutoff Hz.
+        - oneeuro: corte filter_cutoff + filter_beta * |velocidad| (1/s); en
+          reposo quita el jitter del sensor, en movimiento rapido casi no anade lag.
+        La primera muestra de una pulsacion pasa sin filtrar. Entre reportes
+        el lector sigue dando pasos con el ultimo raw (ver settle).
+        """
+        config = config or self.config
+        last = self.f_time[key]
+        self.f_time[key] = now
+        if not last:
+            self.f_value[key] = x
+            self.f_slope[key] = 0.0
+            return x
+
+        dt = (now - last) / 1e9
+        if dt <= 0.0:
+            dt = 1e-4
+        prev = self.f_value[key]
+        cutoff = config.filter_cutoff
+        if config.filter == "oneeuro":
+            slope = self.f_slope[key]
+            slope += ((x - prev) / dt - slope) * dt / (dt + 1.0 / (2 * math.pi * FILTER_D_CUTOFF))
+            self.f_slope[key] = slope
+            cutoff += config.filter_beta * abs(slope)
+
+        value = prev + (x - prev) * dt / (dt + 1.0 / (2 * math.pi * cutoff))
+        self.f_value[key] = value
+        return value
+
+    def rewind(self, keys, config: ProcessorConfig):
+        """
+        Deshace el ultimo paso del filtro de keys, dado con config. El lector
+        lo usa antes de reprocesar un lote con otra config, para que la misma
+        muestra no avance el filtro dos veces.
+        """
+        if config.filter == "none":
+            return  # ese paso no toco el filtro
+        for key in keys:
+            self.f_value[key] = self.f_undo_value[key]
+            self.f_slope[key] = self.f_undo_slope[key]
+            self.f_time[key] = self.f_undo_time[key]
+            self.f_target[key] = self.f_undo_target[key]
+
+    def settle(self) -> list:
+        """
+        Teclas cuyo filtro sigue lejos del objetivo. El teclado solo reporta
+        cambios, asi que una tecla quieta no traeria mas muestras: el lector
+        las vuelve a procesar con su ultimo raw cada FILTER_STEP_MS (ver
+        ReportBatcher.settle) hasta que llegan. Las soltadas salen de la lista.
+        """
+        settling = self.settling
+        if not settling:
+            return settling
+        flags = self._settling
+        if self.config.filter == "none":
+            # Filtro desactivado: un ultimo paso deja la salida en la LUT
+            keys = [key for key in settling if self.store.is_active(key)]
+            for key in settling:
+                flags[key] = 0
+            settling.clear()
+            return keys
+        f_time, f_value, f_target = self.f_time, self.f_value, self.f_target
+        keep = 0
+        for key in settling:
+            if f_time[key] and abs(f_value[key] - f_target[key]) > FILTER_SETTLE_EPS:
+                settling[keep] = key
+                keep += 1
+            else:
+                flags[key] = 0
+        del settling[keep:]
+        return settling
+
+    def clear(self, key: int):
+        self.process(key, 0)
+
+    def reset(self):
+        self.store.reset()
+        self.f_time[:] = array("q", [0]) * 256
+        self._settling[:] = bytes(256)
+        self.settling.clear()
+
+
+class AxisAggregator:
+    """
+    Incremental per-axis aggregation of key values.
+
+    Each update touches only the axis the key feeds. Per axis and direction it
+    keeps the strongest contributor, so only a release (or a drop) of that
+    contributor rescans the keys mapped to that direction. When both directions of an
+    axis are held, the most recently pressed direction wins.
+    With several pads, values holds 6 axes per pad and pad_bits maps a slot to
+    its pad's bit (ReportBatcher.apply returns the mask of changed pads).
+    """
+
+    def __init__(self, table=None, held=(), pads: int = 1):
+        self.table = table if table is not None else [None] * 256
+        axes = len(AXIS_NAMES) * pads
+        self.values = [0.0] * axes
+        self.pad_bits = tuple(1 << (slot // len(AXIS_NAMES)) for slot in range(axes))
+        # Current value of every mapped key, and per side (index slot * 2, +1 for
+        # the negative direction) the keys mapped to it: no containers change per packet
+        self._vals = array("d", [0.0]) * len(self.table)
+        sides = [[] for _ in range(axes * 2)]
+        for key, entry in enumerate(self.table):
+            if entry is not None and entry[0] < axes:
+                sides[entry[0] * 2 if entry[1] > 0 else entry[0] * 2 + 1].append(key)
+        self._side_keys = tuple(tuple(keys) for keys in sides)
+        self._best = [0.0] * (axes * 2)
+        self._best_key = [-1] * (axes * 2)
+        self._last_side = [0] * axes
+        for key, val in held:
+            self.update(key, val)
+
+    def update(self, key: int, val: float) -> int:
+        """Apply the new value of one key; returns the changed axis slot or -1."""
+        entry = self.table[key]
+        if entry is None:
+            return -1
+        slot, sign = entry
+        side = slot * 2 if sign > 0 else slot * 2 + 1
+        vals = self._vals
+
+        if val > 0.0:
+            if vals[key] <= 0.0:
+                self._last_side[slot] = side
+            vals[key] = val
+            if val >= self._best[side]:
+                self._best[side] = val
+                self._best_key[side] = key
+            elif key == self._best_key[side]:
+                self._rescan(side)
+        else:
+            if vals[key] <= 0.0:
+                return -1
+            vals[key] = 0.0
+            if key == self._best_key[side]:
+                self._rescan(side)
+
+        return self._resolve(slot)
+
+    def _rescan(self, side: int):
+        best, best_key = 0.0, -1
+        vals = self._vals
+        for key in self._side_keys[side]:
+            val = vals[key]
+            if val > best:
+                best, best_key = val, key
+        self._best[side] = best
+        self._best_key[side] = best_key
+
+    def _resolve(self, slot: int) -> int:
+        pos = self._best[slot * 2]
+        neg = self._best[slot * 2 + 1]
+        if pos > 0.0 and neg > 0.0:
+            value = pos if self._last_side[slot] == slot * 2 else -neg
+        elif pos > 0.0:
+            value = pos
+        else:
+            value = -neg
+        if value == self.values[slot]:
+            return -1
+        self.values[slot] = value
+        return slot
+
+
+class ReportBatcher:
+    """
+    Drain-and-coalesce of HID reports: reads every pending report in one
+    wakeup and folds them into the latest raw value per key (last value wins),
+    so a burst produces a single aggregated gamepad update.
+    """
+
+    def __init__(self, max_batch: int = MAX_BATCH):
+        self.max_batch = max_batch
+        self.recorder = None  # optional ReportRecorder, sees every raw report
+        self.latest = array("l", [0]) * 256
+        self.values = array("d", [0.0]) * 256  # processed value per touched key
+        self.touched = []
+        self._pending = bytearray(256)
+        # Counters (reset by take_stats)
+        self.batches = 0
+        self.reports = 0
+        self.coalesced = 0
+        self.max_size = 0
+
+    def drain(self, read, wait_ms: int = 0) -> int:
+        """
+        Read pending reports (up to max_batch); returns how many were read.
+        With wait_ms the first read waits in the kernel for up to that long.
+        """
+        n = 0
+        latest = self.latest
+        pending = self._pending
+        while n < self.max_batch:
+            data = read(64, wait_ms) if wait_ms and not n else read(64)
+            if not data:
+                break
+            n += 1
+            if self.recorder:
+                self.recorder.write(data)
+            if len(data) < 7 or data[0] != REPORT_HEADER:
+                continue
+            key = data[3]
+            latest[key] = (data[4] << 8) | data[5]
+            if pending[key]:
+                self.coalesced += 1
+            else:
+                pending[key] = 1
+                self.touched.append(key)
+        if n:
+            self.batches += 1
+            self.reports += n
+            if n > self.max_size:
+                self.max_size = n
+        return n
+
+    def process(self, processor: SignalProcessor):
+        """
+        Run the folded keys through the device's processor; the results wait
+        in values for aggregate(). Needs no shared lock (key state is per device).
+        """
+        latest = self.latest
+        values = self.values
+        process = processor.process
+        for key in self.touched:
+            values[key] = process(key, latest[key])
+
+    def aggregate(self, aggregator: AxisAggregator, base: int = 0) -> int:
+        """Feed the processed keys to aggregator (as base + key); bitmask of pads whose axes changed."""
+        changed = 0
+        values = self.values
+        pending = self._pending
+        bits = aggregator.pad_bits
+        for key in self.touched:
+            pending[key] = 0
+            slot = aggregator.update(base + key, values[key])
+            if slot >= 0:
+                changed |= bits[slot]
+        self.touched.clear()
+        return changed
+
+    def apply(self, processor: SignalProcessor, aggregator: AxisAggregator, base: int = 0) -> int:
+        """process() then aggregate(), for single-threaded callers."""
+        self.process(processor)
+        return self.aggregate(aggregator, base)
+
+    def settle(self, processor: SignalProcessor) -> int:
+        """
+        Queue the keys whose filter is still settling (SignalProcessor.settle)
+        as if their last report arrived again; returns how many are queued.
+        """
+        pending = self._pending
+        touched = self.touched
+        for key in processor.settle():
+            if not pending[key]:
+                pending[key] = 1
+                touched.append(key)
+        return len(touched)
+
+    def discard(self):
+        """Drop the folded keys without processing them."""
+        for key in self.touched:
+            self._pending[key] = 0
+        self.touched.clear()
+
+    def take_stats(self):
+        """(batches, reports, coalesced, max batch size) since the last call."""
+        stats = (self.batches, self.reports, self.coalesced, self.max_size)
+        self.batches = self.reports = self.coalesced = self.max_size = 0
+        return stats
+
+
+def read_batch(batcher: ReportBatcher, device, mode: str, spin_sleep: float,
+               wait_ms: int = READ_TIMEOUT_MS) -> int:
+    """
+    One reader wakeup. 'spin' polls the nonblocking device and naps spin_sleep
+    when empty; 'block' sleeps in hid_read_timeout until a report arrives or
+    wait_ms passes (the device stays nonblocking so the rest of the batch
+    drains without waiting).
+    """
+    if mode == "block":
+        return batcher.drain(device.read, wait_ms)
+    n = batcher.drain(device.read)
+    if not n and spin_sleep:
+        time.sleep(spin_sleep)
+    return n
+
+
+def format_batch_stats(stats) -> str:
+    batches, reports, coalesced, max_size = stats
+    avg = reports / batches if batches else 0.0
+    return f"batch {avg:.1f} avg/{max_size} max | {coalesced} coalesced"
+
+
+# ============================================================================
+# FUENTES DE ENTRADA Y CAPTURA
+# ============================================================================
+
+class InputSource:
+    """
+    Report source behind connect/read loops, read like an open hid.device:
+    read(64) never blocks, read(64, timeout_ms) may wait up to timeout_ms.
+    finished turns True when a finite source runs out.
+    """
+    finished = False
+
+    def describe(self) -> str:
+        return type(self).__name__
+
+    def read(self, max_length: int, timeout_ms: int = 0):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HidSource(InputSource):
+    """A real keyboard through hidapi."""
+
+    def __init__(self, path):
+        self.path = path
+        self.device = require_hid().device()
+        self.device.open_path(path)
+        self.device.set_nonblocking(True)
+
+    def describe(self) -> str:
+        return "Keyboard"
+
+    def read(self, max_length: int, timeout_ms: int = 0):
+        if timeout_ms:
+            return self.device.read(max_length, timeout_ms)
+        return self.device.read(max_length)
+
+    def close(self):
+        self.device.close()
+
+
+class ReplaySource(InputSource):
+    """
+    Memory-mapped replay of a capture file.
+    realtime=True keeps the recorded spacing (read(64, timeout_ms) waits for the
+    next due report); otherwise reports come out as fast as they are read.
+    Sessions appended to one capture play back to back.
+    """
+
+    def __init__(self, path: str, realtime: bool = True):
+        self.path = path
+        self.realtime = realtime
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a Hall capture file")
+        self.total = (len(self._map) - len(CAPTURE_MAGIC)) // CAPTURE_RECORD.size
+        self._pos = 0
+        self._t0 = 0
+        self._start = 0
+
+    def describe(self) -> str:
+        return f"Replay {os.path.basename(self.path)} ({self.total} reports)"
+
+    def read(self, max_length: int, timeout_ms: int = 0):
+        if self._pos >= self.total:
+            self.finished = True
+            return []
+        off = len(CAPTURE_MAGIC) + self._pos * CAPTURE_RECORD.size
+        stamp = struct.unpack_from("<Q", self._map, off)[0]
+        if stamp == CAPTURE_SESSION:
+            # Next recording session: re-anchor the clock on its first report
+            self._pos += 1
+            self._start = 0
+            return self.read(max_length, timeout_ms)
+        if self.realtime:
+            if not self._start:
+                self._t0, self._start = stamp, time.perf_counter_ns()
+            wait = (stamp - self._t0) - (time.perf_counter_ns() - self._start)
+            if wait > 0:
+                if not timeout_ms:
+                    return []
+                time.sleep(min(wait / 1e9, timeout_ms / 1000))
+                return self.read(max_length)
+        self._pos += 1
+        return self._map[off + 8:off + 8 + min(max_length, 64)]
+
+    def close(self):
+        try:
+            self._map.close()
+            self._file.close()
+        except (OSError, ValueError):
+            pass
+
+
+class SyntheticSource(InputSource):
+    """
+    Generator of valid 0xA0 reports at a fixed rate, cycling over 'keys' keys
+    with staggered triangle-wave pressure (each key presses and releases).
+    When the consumer falls behind, due reports come out back to back, so
+    backlog() shows where the pipeline saturates.
+    """
+
+    def __init__(self, rate: int = 1000, keys: int = 4, duration: float = 0.0, peak: int = 1600):
+        self.rate = rate
+        self.codes = SYNTHETIC_KEYS[:max(1, min(keys, len(SYNTHETIC_KEYS)))]
+        self.duration = duration
+        self.peak = peak
+        self.emitted = 0
+        self._start = 0
+
+    def describe(self) -> str:
+        return f"Synthetic {self.rate} pkt/s, {len(self.codes)} keys"
+
+    def due(self) -> int:
+        """Reports that should have been emitted by now."""
+        if not self._start:
+            return 0
+        due = int((time.perf_counter_ns() - self._start) * self.rate // 1_000_000_000) + 1
+        if self.duration:
+            due = min(due, int(self.duration * self.rate))
+        return due
+
+    def backlog(self) -> int:
+        return max(0, self.due() - self.emitted)
+
+    def read(self, max_length: int, timeout_ms: int = 0):
+        if not self._start:
+            self._start = time.perf_counter_ns()
+        if self.emitted >= self.due():
+            if self.duration and self.emitted >= int(self.duration * self.rate):
+                self.finished = True
+                return []
+            if not timeout_ms:
+                return []
+            next_at = self._start + self.emitted * 1_000_000_000 // self.rate
+            wait = min(next_at - time.perf_counter_ns(), timeout_ms * 1_000_000)
+            if wait > 0:
+                time.sleep(wait / 1e9)
+            if self.emitted >= self.due():
+                return []
+        i = self.emitted
+        self.emitted += 1
+        n = len(self.codes)
+        key = self.codes[i % n]
+        # Triangle wave per key, period 64 reports of that key, phase-shifted by key slot
+        phase = (i // n + (i % n) * 16) % 64
+        raw = self.peak * (phase if phase < 32 else 64 - phase) // 32
+        report = bytearray(min(max_length, 64))
+        report[0] = REPORT_HEADER
+        report[3] = key
+        report[4] = raw >> 8
+        report[5] = raw & 0xFF
+        return report
+
+
+class ReportRecorder:
+    """
+    Append-only binary capture of raw HID reports with perf_counter_ns stamps.
+    Appending to an existing capture starts with a CAPTURE_SESSION record, so
+    replay does not wait out the time between sessions.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+        else:
+            self._file.write(CAPTURE_RECORD.pack(CAPTURE_SESSION, bytes(64)))
+
+    def write(self, data):
+        self._file.write(CAPTURE_RECORD.pack(time.perf_counter_ns(), bytes(data[:64])))
+        self.count += 1
+
+    def close(self):
+        try:
+            self._file.close()
+        except OSError:
+            pass
+
+
+def recorder_from_cli():
+    path = cli_value("--record", "")
+    return ReportRecorder(path) if path else None
+
+
+def sources_from_cli() -> list:
+    """
+    Replay or synthetic sources selected on the command line, one per device:
+    --replay A.bin,B.bin or --synthetic --devices N. Empty means real keyboards.
+    """
+    paths = cli_value("--replay", "")
+    if paths:
+        realtime = "--replay-fast" not in sys.argv
+        return [ReplaySource(path, realtime=realtime) for path in paths.split(",") if path]
+    if "--synthetic" in sys.argv:
+        return [
+            SyntheticSource(
+                rate=int(cli_value("--rate", "1000")),
+                keys=int(cli_value("--keys", "4")),
+                duration=float(cli_value("--duration", "0")),
+            )
+            for _ in range(max(1, int(cli_value("--devices", "1"))))
+        ]
+    return []
+
+
+# ============================================================================
+# SALIDA: GAMEPAD VIRTUAL
+# ============================================================================
+
+class OutputSink:
+    """
+    Virtual pad output with the vgamepad VX360Gamepad surface: triggers take
+    0..255, sticks take -32768..32767, update() emits the current state.
+    emit() diffs against the last values sent: only dirty axes are set, and
+    an unchanged report skips update() entirely (counted in suppressed).
+    """
+    UNSENT = -1 << 20  # no axis ever takes this value: first emit sends everything
+
+    def __init__(self):
+        self.updates = 0
+        self.suppressed = 0
+        self.first_ns = 0  # perf_counter_ns of the first emit() that reached update()
+        # lt, rt, lx, ly, rx, ry as last handed to the setters
+        self.sent = array("l", [self.UNSENT]) * 6
+
+    def describe(self) -> str:
+        return type(self).__name__
+
+    def left_trigger(self, value: int):
+        pass
+
+    def right_trigger(self, value: int):
+        pass
+
+    def left_joystick(self, x: int, y: int):
+        pass
+
+    def right_joystick(self, x: int, y: int):
+        pass
+
+    def update(self):
+        self.updates += 1
+
+    def emit(self, lt: int, rt: int, lx: int, ly: int, rx: int, ry: int) -> bool:
+        """Set the axes that changed and update(); False (no call at all) if none did."""
+        sent = self.sent
+        dirty = False
+        if lt != sent[0]:
+            self.left_trigger(lt)
+            sent[0] = lt
+            dirty = True
+        if rt != sent[1]:
+            self.right_trigger(rt)
+            sent[1] = rt
+            dirty = True
+        if lx != sent[2] or ly != sent[3]:
+            self.left_joystick(lx, ly)
+            sent[2] = lx
+            sent[3] = ly
+            dirty = True
+        if rx != sent[4] or ry != sent[5]:
+            self.right_joystick(rx, ry)
+            sent[4] = rx
+            sent[5] = ry
+            dirty = True
+        if not dirty:
+            self.suppressed += 1
+            return False
+        self.update()
+        if not self.first_ns:
+            self.first_ns = time.perf_counter_ns()
+        return True
+
+    def reset(self):
+        """Center sticks, release triggers and emit."""
+        self.left_trigger(0)
+        self.right_trigger(0)
+        self.left_joystick(0, 0)
+        self.right_joystick(0, 0)
+        self.sent[:] = array("l", [0]) * 6
+        self.update()
+
+    def close(self):
+        pass
+
+
+class ViGEmSink(OutputSink):
+    """Virtual Xbox 360 pad through ViGEmBus."""
+
+    def __init__(self):
+        super().__init__()
+        if load_vgamepad() is None:
+            raise RuntimeError("vgamepad is not installed")
+        self.pad = vg.VX360Gamepad()
+        # Bound methods straight through: no extra Python frame per call
+        self.left_trigger = self.pad.left_trigger
+        self.right_trigger = self.pad.right_trigger
+        self.left_joystick = self.pad.left_joystick
+        self.right_joystick = self.pad.right_joystick
+
+    def describe(self) -> str:
+        return "ViGEm X360"
+
+    def update(self):
+        self.pad.update()
+        self.updates += 1
+
+
+class NullSink(OutputSink):
+    """Discards output; counts update() calls."""
+
+    def describe(self) -> str:
+        return "Null output"
+
+
+class RecordingSink(OutputSink):
+    """Logs every emitted state with a perf_counter_ns stamp to a binary file."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._state = [0, 0, 0, 0, 0, 0]  # lt, rt, lx, ly, rx, ry
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(OUTPUT_MAGIC)
+
+    def describe(self) -> str:
+        return f"Recording output to {self.path}"
+
+    def left_trigger(self, value: int):
+        self._state[0] = value
+
+    def right_trigger(self, value: int):
+        self._state[1] = value
+
+    def left_joystick(self, x: int, y: int):
+        self._state[2] = x
+        self._state[3] = y
+
+    def right_joystick(self, x: int, y: int):
+        self._state[4] = x
+        self._state[5] = y
+
+    def update(self):
+        self._file.write(OUTPUT_RECORD.pack(time.perf_counter_ns(), *self._state))
+        self.updates += 1
+
+    def close(self):
+        try:
+            self._file.close()
+        except OSError:
+            pass
+
+
+def sink_from_cli(index: int = 0) -> OutputSink:
+    """
+    Output sink for pad `index` selected with --sink (vigem by default); raises
+    if it cannot start. Recordings of pads 2+ go to FILE.padN.bin.
+    """
+    kind = cli_value("--sink", "vigem")
+    if kind not in SINKS:
+        print(f"Unknown sink '{kind}', using vigem")
+        kind = "vigem"
+    if kind == "null":
+        return NullSink()
+    if kind == "record":
+        path = cli_value("--output-file", "gamepad_output.bin")
+        if index:
+            root, ext = os.path.splitext(path)
+            path = f"{root}.pad{index + 1}{ext}"
+        return RecordingSink(path)
+    return ViGEmSink()
+
+
+def emit_axes(gamepad, lx: float, ly: float, rx: float, ry: float, lt: float, rt: float) -> bool:
+    """Quantize normalized axes and send them; False if the quantized report did not change."""
+    return gamepad.emit(
+        int(lt * 255), int(rt * 255),
+        int(lx * 32767), int(ly * 32767),
+        int(rx * 32767), int(ry * 32767),
+    )
+
+
+def emit_interpolated(gamepad, prev, targets) -> int:
+    """
+    Micro-interpolation from prev to targets (axis sequences in AXIS_* order):
+    1-3 reports depending on the largest axis jump. Returns the number of
+    reports sent (0 if nothing moved).
+    """
+    max_delta = 0.0
+    for slot in AXIS_SLOTS:
+        d = abs(targets[slot] - prev[slot])
+        if d > max_delta:
+            max_delta = d
+    if max_delta < 1e-4:
+        return 0
+
+    steps = 1
+    if max_delta > 0.35:
+        steps = 3
+    elif max_delta > 0.2:
+        steps = 2
+
+    for i in range(1, steps + 1):
+        t = i / steps
+        emit_axes(
+            gamepad,
+            prev[AXIS_LX] + (targets[AXIS_LX] - prev[AXIS_LX]) * t,
+            prev[AXIS_LY] + (targets[AXIS_LY] - prev[AXIS_LY]) * t,
+            prev[AXIS_RX] + (targets[AXIS_RX] - prev[AXIS_RX]) * t,
+            prev[AXIS_RY] + (targets[AXIS_RY] - prev[AXIS_RY]) * t,
+            prev[AXIS_LT] + (targets[AXIS_LT] - prev[AXIS_LT]) * t,
+            prev[AXIS_RT] + (targets[AXIS_RT] - prev[AXIS_RT]) * t,
+        )
+    return steps
+
+
+class AxisBuffer:
+    """
+    Seqlock-style handoff of the axis targets from the reader (single writer)
+    to the pad thread. Fixed layout, preallocated: the six axes in AXIS_*
+    order plus the (read ns, publish ns, device index) stamps of --latency.
+
+    The writer makes seq odd, writes, then makes it even again; a reader
+    copies and retries while seq is odd or changed under it, so it never sees
+    a half-written set. Neither side allocates containers per packet.
+    """
+
+    __slots__ = ("seq", "axes", "stamps")
+    STAMPS = 3
+
+    def __init__(self):
+        self.seq = 0
+        self.axes = array('d', bytes(8 * len(AXIS_SLOTS)))
+        self.stamps = array('q', bytes(8 * self.STAMPS))
+
+    def publish(self, values, stamp: int = 0, published: int = 0, source: int = 0, offset: int = 0) -> bool:
+        """Store values[offset:offset + 6]; False (nothing written) if no axis moved by 1e-4."""
+        axes = self.axes
+        for slot in AXIS_SLOTS:
+            if abs(values[offset + slot] - axes[slot]) >= 1e-4:
+                break
+        else:
+            return False
+
+        self.seq += 1
+        for slot in AXIS_SLOTS:
+            axes[slot] = values[offset + slot]
+        self.stamps[0] = stamp
+        self.stamps[1] = published
+        self.stamps[2] = source
+        self.seq += 1
+        return True
+
+    def read_into(self, axes, stamps) -> int:
+        """Copy a consistent set into the caller's arrays; returns its (even) seq."""
+        while True:
+            seq = self.seq
+            if seq & 1:
+                time.sleep(0)  # writer mid-update: let it finish
+                continue
+            axes[:] = self.axes
+            stamps[:] = self.stamps
+            if self.seq == seq:
+                return seq
+
+    def clear(self):
+        """Publish centered axes (no stamps)."""
+        self.publish(ZERO_AXES)
+
+
+class OutputScheduler:
+    """
+    Tick clock and stats for --output fixed: deadlines every 1/rate s, slept
+    towards and spun over the last spin_ns (sleep() overshoots by up to a
+    timer tick; at most a quarter period, so fast rates mostly sleep).
+    Lateness is kept as tick jitter; ticks that passed entirely are counted
+    as missed and skipped, not burst out afterwards.
+    """
+    SPIN_NS = 1_000_000
+
+    def __init__(self, rate: int = OUTPUT_RATE):
+        self.rate = rate
+        self.period_ns = 1_000_000_000 // rate
+        self.spin_ns = min(self.SPIN_NS, self.period_ns // 4)
+        self.jitter = LatencyHistogram("tick jitter")
+        self.ticks = 0
+        self.missed = 0
+        self.emitted = 0
+        self.deadline = 0
+
+    def restart(self):
+        self.deadline = time.perf_counter_ns() + self.period_ns
+
+    def wait(self):
+        """Block until the next deadline and advance it."""
+        deadline = self.deadline
+        while True:
+            remaining = deadline - time.perf_counter_ns()
+            if remaining <= 0:
+                break
+            if remaining > self.spin_ns:
+                time.sleep((remaining - self.spin_ns) / 1e9)
+            else:
+                time.sleep(0)  # spin, but let the reader have the GIL
+
+        late = -remaining
+        self.jitter.record(late)
+        self.ticks += 1
+        if late >= self.period_ns:
+            skipped = late // self.period_ns
+            self.missed += skipped
+            deadline += skipped * self.period_ns
+        self.deadline = deadline + self.period_ns
+
+    def short(self) -> str:
+        j = self.jitter.summary()
+        return (f"{self.rate} Hz: {self.emitted}/{self.ticks} ticks emitted, "
+                f"{self.missed} missed, jitter p99 {j['p99_us']:.0f}us")
+
+
+def output_rate_from_cli() -> int:
+    try:
+        rate = int(cli_value("--output-rate", str(OUTPUT_RATE)))
+    except ValueError:
+        rate = 0
+    if rate <= 0:
+        print(f"Invalid --output-rate, using {OUTPUT_RATE}")
+        rate = OUTPUT_RATE
+    return rate
+
+
+def ui_fps_from_cli() -> float:
+    try:
+        fps = float(cli_value("--ui-fps", str(UI_FPS)))
+    except ValueError:
+        fps = 0.0
+    if not 0.0 < fps < math.inf:
+        print(f"Invalid --ui-fps, using {UI_FPS}")
+        fps = UI_FPS
+    return fps
+
+
+# ============================================================================
+# LATENCIA: HID READ -> GAMEPAD UPDATE
+# ============================================================================
+
+class LatencyHistogram:
+    """Fixed log-scale histogram in ns: 4 buckets per power of two up to ~68 s."""
+    BUCKETS = 36 * 4
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = array("Q", [0]) * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int):
+        if ns < 1:
+            ns = 1
+        e = ns.bit_length() - 1
+        idx = e * 4 + ((ns >> (e - 2)) & 3) if e >= 2 else e * 4
+        if idx >= self.BUCKETS:
+            idx = self.BUCKETS - 1
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    @staticmethod
+    def bucket_upper(idx: int) -> int:
+        e, sub = idx >> 2, idx & 3
+        return (5 + sub) << (e - 2) if e >= 2 else 1 << (e + 1)
+
+    def percentile(self, q: float) -> int:
+        """Upper bound (ns) of the bucket holding the q-quantile, capped at max."""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= rank:
+                return min(self.bucket_upper(idx), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """count, mean/p50/p90/p99/max in microseconds."""
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count / 1000, 2) if self.count else 0.0,
+            "p50_us": round(self.percentile(0.50) / 1000, 2),
+            "p90_us": round(self.percentile(0.90) / 1000, 2),
+            "p99_us": round(self.percentile(0.99) / 1000, 2),
+            "max_us": round(self.max / 1000, 2),
+        }
+
+
+class LatencyStats:
+    """
+    Per-stage histograms for one report's trip from HID read to gamepad.update():
+    process (read -> processed/aggregated), publish (-> targets handed to output),
+    output (-> update() returned) and total (read -> update() returned).
+    Front ends keep metrics=None when disabled, so the hot path pays one check.
+    """
+    STAGES = ("process", "publish", "output", "total")
+
+    def __init__(self):
+        self.process = LatencyHistogram("read->process")
+        self.publish = LatencyHistogram("process->publish")
+        self.output = LatencyHistogram("publish->output")
+        self.total = LatencyHistogram("read->output")
+
+    def stages(self):
+        return [getattr(self, name) for name in self.STAGES]
+
+    def short(self) -> str:
+        t = self.total.summary()
+        return f"e2e p50 {t['p50_us']:.0f}us p99 {t['p99_us']:.0f}us max {t['max_us']:.0f}us"
+
+    def lines(self) -> list:
+        out = [f"{'stage':<18} {'count':>8} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9} {'max us':>10}"]
+        for h in self.stages():
+            d = h.summary()
+            out.append(
+                f"{h.name:<18} {d['count']:>8} {d['p50_us']:>9.1f} {d['p90_us']:>9.1f} "
+                f"{d['p99_us']:>9.1f} {d['max_us']:>10.1f}"
+            )
+        return out
+
+    def to_dict(self) -> dict:
+        return {
+            name: dict(h.summary(), name=h.name, buckets={
+                str(LatencyHistogram.bucket_upper(i)): c for i, c in enumerate(h.counts) if c
+            })
+            for name, h in zip(self.STAGES, self.stages())
+        }
+
+    def dump_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def latency_from_cli():
+    """LatencyStats when --latency or --latency-json FILE is given, else None."""
+    if "--latency" in sys.argv or cli_value("--latency-json", ""):
+        return LatencyStats()
+    return None
+
+
+# ============================================================================
+# DETECCION DE DISPOSITIVOS
+# ============================================================================
+
+def probe_hid(item: dict, window_ms: int = PROBE_WINDOW_MS) -> dict:
+    """
+    Open one HID path and sample its reports for up to window_ms (stops at the
+    first analog report). Fills hits (0xA0 reports), reports, size (largest
+    report), status ('ok' / 'error') and probe_ms into item and returns it.
+    """
+    start = time.perf_counter()
+    item['hits'] = item['reports'] = item['size'] = 0
+    item['status'] = 'ok'
+    try:
+        dev = require_hid().device()
+        dev.open_path(item['path'])
+        try:
+            dev.set_nonblocking(True)
+            deadline = start + window_ms / 1000
+            while True:
+                left = int((deadline - time.perf_counter()) * 1000)
+                if left <= 0:
+                    break
+                data = dev.read(64, left)
+                if not data:
+                    continue
+                item['reports'] += 1
+                item['size'] = max(item['size'], len(data))
+                if data[0] == REPORT_HEADER:
+                    item['hits'] += 1
+                    break
+        finally:
+            dev.close()
+    except:
+        item['status'] = 'error'
+    item['probe_ms'] = (time.perf_counter() - start) * 1000
+    return item
+
+
+def probe_devices(items: list, workers: int = PROBE_WORKERS, window_ms: int = PROBE_WINDOW_MS,
+                  timeout: float = PROBE_TIMEOUT) -> list:
+    """
+    probe_hid over every item on a bounded pool of daemon threads. A device
+    still probing after window + timeout is marked 'timeout' and left behind
+    (its thread is a daemon, it cannot block exit). Workers probe a copy and
+    only copy the result back while the item is still pending, so a late
+    thread cannot overwrite the timeout. Returns the items.
+    """
+    pending = collections.deque(items)
+    lock = threading.Lock()
+    done = threading.Event()
+    left = [len(items)]
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                item = pending.popleft()
+                item['started'] = time.perf_counter()
+                probe = dict(item)
+            probe_hid(probe, window_ms)
+            with lock:
+                if 'probe_ms' not in item:
+                    item.update(probe)
+                left[0] -= 1
+                if not left[0]:
+                    done.set()
+
+    if not items:
+        return items
+    for _ in range(min(workers, len(items))):
+        threading.Thread(target=worker, daemon=True).start()
+
+    limit = window_ms / 1000 + timeout
+    while not done.wait(0.01):
+        now = time.perf_counter()
+        with lock:
+            running = [it for it in items if 'started' in it and 'probe_ms' not in it]
+            # Every busy worker is past its limit: nothing more will finish in time
+            if running and all(now - it['started'] > limit for it in running):
+                break
+    with lock:
+        for it in items:
+            if 'probe_ms' not in it:
+                it['status'] = 'timeout'
+                it.setdefault('hits', 0)
+                it.setdefault('reports', 0)
+                it.setdefault('size', 0)
+                it['probe_ms'] = (time.perf_counter() - it['started']) * 1000 if 'started' in it else 0.0
+            it.pop('started', None)
+    return items
+
+
+def device_fingerprint(item: dict) -> str:
+    """Cache key of one enumerated interface: VID:PID:iface:path."""
+    path = item.get('path') or b""
+    if isinstance(path, bytes):
+        path = path.decode("utf-8", "replace")
+    return f"{item.get('vid') or 0:04X}:{item.get('pid') or 0:04X}:{item.get('iface')}:{path}"
+
+
+def load_probe_cache(fingerprints: list):
+    """
+    (entries, valid): the cached probe results by fingerprint, and whether they
+    were taken with exactly this hid.enumerate() set. Stale entries are still
+    returned so known-good devices can be probed first.
+    """
+    try:
+        with open(PROBE_CACHE_FILE, "r") as f:
+            d = json.load(f)
+        entries = d.get("entries", {})
+        return entries, sorted(d.get("devices", [])) == sorted(fingerprints)
+    except:
+        return {}, False
+
+
+def save_probe_cache(items: list, previous: dict = None):
+    """
+    Store the probe results. A device that opened but stayed silent keeps the
+    hits/last_seen of its previous entry (Hall keyboards only report on change,
+    so an idle one is the normal case); a failed or hung one gets no entry.
+    """
+    previous = previous or {}
+    entries = {}
+    now = int(time.time())
+    for item in items:
+        if item.get('status') != 'ok':
+            continue  # a failed or hung probe says nothing about the device
+        fingerprint = device_fingerprint(item)
+        entry = {
+            "hits": item['hits'],
+            "reports": item['reports'],
+            "size": item['size'],
+            "last_seen": now,
+        }
+        old = previous.get(fingerprint)
+        if not item['hits'] and old and old.get("hits"):
+            entry["hits"] = old["hits"]
+            entry["last_seen"] = old.get("last_seen", now)
+        entries[fingerprint] = entry
+    try:
+        write_atomic(PROBE_CACHE_FILE, json.dumps(
+            {"devices": sorted(device_fingerprint(it) for it in items), "entries": entries}, indent=2))
+    except Exception as e:
+        print(f"Probe cache save error: {e}")
+
+
+# ============================================================================
+# MOTOR DE MAPEO (compartido por GUI y headless)
+# ============================================================================
+
+def write_atomic(path: str, text: str):
+    """Write through a temp file and os.replace: the file is never left half-written."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ConfigWriter:
+    """
+    Background writer for hall_config.json. submit() just keeps the latest
+    config; a daemon thread writes it once no newer one arrived for 'delay'
+    seconds (a slider drag becomes one write), atomically, and not at all if
+    the JSON matches what is already on disk. Pending changes are flushed at
+    exit.
+    """
+
+    def __init__(self, path: str = CONFIG_FILE, delay: float = CONFIG_DEBOUNCE):
+        self.path = path
+        self.delay = delay
+        self.writes = 0
+        self.skipped = 0    # submits that matched the file
+        self.written = None  # JSON text last known to be on disk
+        self._pending = None
+        self._due = 0.0
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def submit(self, cfg: dict):
+        """Queue cfg (must not be mutated afterwards) for the next write."""
+        with self._cond:
+            self._pending = cfg
+            self._due = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                left = self._due - time.monotonic()
+                if left > 0:
+                    self._cond.wait(left)
+                    continue
+            self.flush()
+
+    def flush(self):
+        """Write the pending config now (no-op if there is none)."""
+        with self._write_lock:
+            with self._cond:
+                cfg, self._pending = self._pending, None
+            if cfg is None:
+                return
+            text = json.dumps(cfg, indent=2)
+            if self.written is None:
+                try:
+                    with open(self.path, "r") as f:
+                        self.written = f.read()
+                except:
+                    pass
+            if text == self.written:
+                self.skipped += 1
+                return
+            # Set first: a watcher must never take our own write for an outside edit
+            previous, self.written = self.written, text
+            try:
+                write_atomic(self.path, text)
+                self.writes += 1
+            except Exception as e:
+                self.written = previous
+                print(f"Config save error: {e}")
+
+
+def output_mode_from_cli(default: str) -> str:
+    mode = cli_value("--output", default)
+    if mode not in OUTPUT_MODES:
+        print(f"Unknown output mode '{mode}', using {default}")
+        mode = default
+    return mode
+
+
+class ConfigSnapshot:
+    """
+    What the readers run on, published as one reference (MappingEngine.active):
+    the compiled action table of every device and the shared ProcessorConfig.
+    Immutable; a mapping or settings change publishes a new one, so every
+    batch is processed and aggregated with the same config.
+    """
+    __slots__ = ("table", "processor")
+
+    def __init__(self, table: tuple, processor: ProcessorConfig):
+        self.table = table
+        self.processor = processor
+
+
+class DirectHandoff:
+    """
+    Direct mode: pad axes copied under the engine lock by one caller (a reader
+    thread, or a mapping change), emitted by that same caller after the lock is
+    released. seqs holds the pad's publish sequence of each copy, so an older
+    copy never overwrites a newer one already emitted by another reader.
+    """
+    __slots__ = ("axes", "seqs")
+
+    def __init__(self):
+        self.axes = array("d", [0.0]) * (len(AXIS_NAMES) * MAX_PADS)
+        self.seqs = array("Q", [0]) * MAX_PADS
+
+
+class DeviceSlot:
+    """
+    One input device of the engine: its source, reader thread, batcher and
+    SignalProcessor (key state is per device), plus per-device stats. Its keys
+    enter the shared AxisAggregator as index * 256 + HID code, so every device
+    has its own mappings (None = the engine's main mappings).
+    """
+
+    def __init__(self, index: int, source: InputSource, processor: SignalProcessor = None, mappings=None):
+        self.index = index
+        self.base = index * 256
+        self.source = source
+        self.processor = processor or SignalProcessor()
+        self.mappings = mappings
+        self.batcher = None
+        self.handoff = DirectHandoff()
+        self.thread = None
+        self.reports = 0
+        self.pps = 0.0
+        self._last_reports = 0
+        # Per-device latency, only when several devices share the metrics
+        self.metrics = None
+
+    def describe(self) -> str:
+        return f"#{self.index} {self.source.describe()}"
+
+
+class PadOutput:
+    """
+    One virtual pad: its sink plus its own hand-off buffer, interpolation state
+    and (threaded output modes) output thread and tick clock, so a burst on
+    one pad never queues behind another. Its axes are aggregator slots
+    index * 6 .. index * 6 + 5.
+    """
+
+    def __init__(self, index: int, gamepad: OutputSink, rate: int = 0):
+        self.index = index
+        self.base = index * len(AXIS_NAMES)
+        self.gamepad = gamepad
+        # Direct mode: publish sequence (under the engine lock) and the last one
+        # emitted; emit_lock serializes readers emitting to this pad
+        self.seq = 0
+        self.emitted = 0
+        self.emit_lock = threading.Lock()
+        # Previous state for micro-interpolation (AXIS_* order)
+        self.prev_axes = array('d', bytes(8 * len(AXIS_SLOTS)))
+        # Target state for the pad thread, with its latency stamps
+        self.axis_buffer = AxisBuffer()
+        self.event = threading.Event()
+        self.thread = None
+        # Tick clock of --output fixed
+        self.scheduler = OutputScheduler(rate) if rate else None
+
+    def describe(self) -> str:
+        return f"Pad {self.index + 1} ({self.gamepad.describe()})"
+
+
+class UiSnapshot:
+    """
+    Compact copy of the engine state for one UI frame (MappingEngine.ui_snapshot):
+    pad 1 output axes, active bitset, {code: (raw, filtered)} of held keys,
+    report counters (total and per device) and whether every source finished.
+    """
+    __slots__ = ("axes", "active", "keys", "reports", "device_reports", "finished")
+
+    def __init__(self, axes, active, keys, reports, device_reports, finished):
+        self.axes = axes
+        self.active = active
+        self.keys = keys
+        self.reports = reports
+        self.device_reports = device_reports
+        self.finished = finished
+
+
+class MappingEngine:
+    """
+    UI-agnostic mapping core driven by both front ends: config, input sources,
+    reader threads, processing, aggregation, output scheduling and stats.
+
+    Every device (DeviceSlot) has its own reader thread; they meet in the one
+    AxisAggregator under a lock that covers only aggregation and the hand-off
+    to the output. Processing (LUT, filter) runs before the lock and direct
+    mode emits after it, so a busy device never waits on another one's reads,
+    processing or driver calls.
+
+    Mappings may target up to MAX_PADS virtual pads ("Pad N: " prefix); each
+    one is a PadOutput with its own sink and output thread. In direct mode
+    there is no pad thread: each reader emits the pads its device changed,
+    under that pad's emit_lock, so readers feeding different pads emit in
+    parallel, but one device mapped to several pads emits them in sequence.
+    Full isolation of a pad from a busy device needs a threaded mode.
+
+    Output modes: 'interpolated' hands targets to gamepad_loop (micro-interpolation
+    on its own thread), 'direct' emits from the reader thread on every change,
+    'fixed' hands them to fixed_rate_loop (one coalesced update per tick).
+    Front ends hook in through on_stats (every stats_interval, with total
+    pkt/s; per device in slots[i].pps) and on_finished (every finite source
+    ran out); both are called from reader threads. A UI polls ui_snapshot()
+    on its own clock instead, so the readers do no UI work at all.
+    """
+
+    def __init__(self, output_mode: str = "interpolated"):
+        self.running = False
+        self.device = None   # InputSource of the primary device
+        self.pads = []       # PadOutput, pad 1 first
+        self.sink_factory = None  # index -> OutputSink, set by open_pads
+        self.mappings = {}
+        self.settings = {
+            "deadzone": 0,
+            "sensitivity": 1.0,
+            "max_pressure": 1600,
+            "curve": "linear",
+            "filter": "none",
+            "filter_cutoff": 5.0,
+            "filter_beta": 1.0,
+        }
+        self.device_info = None  # {'vid': int, 'pid': int, 'iface': int}
+        self.config_writer = ConfigWriter()
+        self._watcher = None  # watch_config thread
+        self.reloads = 0
+        self.scan_ms = 0.0  # duration of the last scan_devices
+        # Extra devices: [{'vid', 'pid', 'iface', optional 'mappings'}]
+        self.extra_devices = []
+
+        # Low-latency signal processor (primary device)
+        self.processor = SignalProcessor()
+        self.slots = []
+        self.active = ConfigSnapshot(tuple(compile_mappings(self.mappings)), self.processor.config)
+        self.aggregator = AxisAggregator(self.active.table)
+        self.lock = threading.Lock()
+
+        self.output_mode = output_mode
+        # Per-pad tick rate of --output fixed (0 = no tick clock)
+        self.output_rate = output_rate_from_cli() if output_mode == "fixed" else 0
+        # Batch mode: drain every pending report per wakeup, last value per key wins
+        self.batch_mode = "--batch" in sys.argv
+        # Reader: 'spin' (poll) or 'block' (kernel wait with timeout)
+        self.reader_mode = reader_mode_from_cli()
+        self.spin_sleep = 0.00005
+        self.recorder = None  # --record FILE
+        # Latency histograms (--latency / --latency-json FILE); None = disabled
+        self.metrics = latency_from_cli()
+        self.batcher = None  # primary device's
+        self.started_at = 0.0
+        self.finished = False  # every source of the current session ran out
+
+        self.on_stats = None
+        self.stats_interval = 1.0
+        self.on_finished = None
+        self.on_reload = None  # parsed config -> None, from the watcher thread
+
+    # --- Config -------------------------------------------------------------
+
+    @property
+    def action_table(self) -> tuple:
+        return self.active.table
+
+    def device_mappings(self, index: int):
+        """Own mappings of device index (extra_devices[index - 1]), None = the main ones."""
+        if index and index <= len(self.extra_devices):
+            return self.extra_devices[index - 1].get("mappings")
+        return None
+
+    def apply_mappings(self, processor: ProcessorConfig = None):
+        """
+        Recompile the main and per-device mappings and publish them (with new
+        processor settings, if given) as one ConfigSnapshot; the axis
+        aggregation is re-seeded from held keys.
+        """
+        pads = max([mapping_pads(self.mappings)] + [
+            mapping_pads(dev["mappings"]) for dev in self.extra_devices if "mappings" in dev
+        ])
+        self.ensure_pads(pads)
+        pads = max(pads, len(self.pads))
+        # Device i owns entries i * 256 .. i * 256 + 255
+        table = []
+        for slot in self.slots:
+            slot.mappings = self.device_mappings(slot.index)
+            table += compile_mappings(self.mappings if slot.mappings is None else slot.mappings)
+        self.publish(tuple(table or compile_mappings(self.mappings)), processor, pads)
+
+    def publish(self, table: tuple = None, processor: ProcessorConfig = None, pads: int = 1):
+        """
+        Swap in a ConfigSnapshot with the new table and/or processor config,
+        built aside. A new table also swaps in an aggregator re-seeded from the
+        held keys, read under the lock with the swap so no batch lands in the
+        old aggregator unseen. Readers install the processor config on their
+        own processor (read_loop); with none running it is installed here.
+        """
+        active = self.active
+        snapshot = ConfigSnapshot(active.table if table is None else table, processor or active.processor)
+        with self.lock:
+            if table is not None:
+                if self.slots:
+                    held = [(slot.base + code, val)
+                            for slot in self.slots for code, val in slot.processor.store.held()]
+                else:
+                    held = self.processor.store.held()
+                self.aggregator = AxisAggregator(table, held, pads)
+            self.active = snapshot
+        if not self.running:
+            for proc in [self.processor] + [s.processor for s in self.slots[1:]]:
+                proc.use(snapshot.processor)
+
+    def set_mapping(self, code: int, action: str):
+        """Assign (or clear with "None") a key's action and refresh the output."""
+        if action == "None":
+            self.mappings.pop(str(code), None)
+        else:
+            self.mappings[str(code)] = action
+        self.apply_mappings()
+        self.refresh_pads()
+
+    def refresh_pads(self):
+        """Re-send every pad's aggregated axes (after a mapping or config change)."""
+        handoff = DirectHandoff()
+        with self.lock:
+            emit = self.update_gamepad(handoff=handoff)
+        if emit:
+            self.emit_direct(handoff, emit)
+
+    @property
+    def gamepad(self):
+        """Sink of pad 1 (None until open_pads)."""
+        return self.pads[0].gamepad if self.pads else None
+
+    def open_pads(self, factory):
+        """Create pad sinks with factory(index): pad 1 now, more as mappings need them."""
+        self.sink_factory = factory
+        self.ensure_pads(1)
+        self.apply_mappings()
+
+    def ensure_pads(self, count: int):
+        """Open pads up to count (capped at MAX_PADS); a failing sink stops the growth."""
+        if not self.sink_factory:
+            return
+        while len(self.pads) < min(count, MAX_PADS):
+            index = len(self.pads)
+            try:
+                sink = self.sink_factory(index)
+            except Exception as e:
+                if not index:
+                    raise
+                print(f"Pad {index + 1} error: {e}")
+                return
+            pad = PadOutput(index, sink, self.output_rate)
+            self.pads.append(pad)
+            if self.running:
+                self.start_pad(pad)
+
+    def sync_processor(self):
+        """
+        Sincroniza settings con el procesador de se?ales (todos los dispositivos):
+        un solo ProcessorConfig compartido, publicado en la ConfigSnapshot.
+        """
+        self.publish(processor=self.processor_config())
+
+    def processor_config(self) -> ProcessorConfig:
+        """ProcessorConfig de los settings actuales (reutiliza la LUT si la curva no cambio)."""
+        return self.active.processor.replace(
+            deadzone=self.settings["deadzone"],
+            sensitivity=self.settings["sensitivity"],
+            max_pressure=self.settings["max_pressure"],
+            curve=self.settings.get("curve", "linear"),
+            filter=self.settings.get("filter", "none"),
+            filter_cutoff=self.settings.get("filter_cutoff", 5.0),
+            filter_beta=self.settings.get("filter_beta", 1.0),
+        )
+
+    def load_config(self) -> bool:
+        """Load hall_config.json (or the legacy file); True if a file was read."""
+        try:
+            cfg_path = CONFIG_FILE if os.path.exists(CONFIG_FILE) else LEGACY_CONFIG_FILE
+            if not os.path.exists(cfg_path):
+                return False
+            with open(cfg_path, "r") as f:
+                self.apply_config(json.load(f))
+            return True
+        except Exception as e:
+            print(f"Config load error: {e}")
+            return False
+
+    def apply_config(self, d: dict):
+        """Take mappings, settings, device info and extra devices from a parsed config."""
+        self.mappings = translate_actions(d.get("mappings", d.get("Mappings", {})))
+        s = d.get("settings", d.get("Settings", {}))
+        self.settings["deadzone"] = s.get("deadzone", s.get("Deadzone", 30))
+        self.settings["sensitivity"] = s.get("sensitivity", s.get("Sensitivity", 1.0))
+        self.settings["max_pressure"] = s.get("max_pressure", s.get("MaxPressure", 600))
+        self.settings["curve"] = s.get("curve", s.get("Curve", "linear"))
+        self.settings["filter"] = s.get("filter", "none")
+        self.settings["filter_cutoff"] = s.get("filter_cutoff", 5.0)
+        self.settings["filter_beta"] = s.get("filter_beta", 1.0)
+        di = d.get("device_info")
+        if di:
+            self.device_info = {
+                "vid": di.get("vid"),
+                "pid": di.get("pid"),
+                "iface": di.get("iface"),
+            }
+        self.extra_devices = []
+        for dev in d.get("devices", []):
+            extra = {
+                "vid": dev.get("vid"),
+                "pid": dev.get("pid"),
+                "iface": dev.get("iface"),
+            }
+            if "mappings" in dev:
+                extra["mappings"] = translate_actions(dev["mappings"])
+            self.extra_devices.append(extra)
+        self.apply_mappings(self.processor_config())
+
+    def reload_config(self, d: dict) -> float:
+        """
+        Hot-reload a parsed config while running: the new processor settings,
+        main and per-device mappings are built aside and swapped in as one
+        ConfigSnapshot, then the pads are refreshed. Device selection changes
+        apply on the next connect. Returns the time it took in ms.
+        """
+        start = time.perf_counter()
+        self.apply_config(d)
+        self.refresh_pads()
+        self.reloads += 1
+        return (time.perf_counter() - start) * 1000
+
+    def watch_config(self, interval: float = CONFIG_POLL):
+        """
+        Poll hall_config.json on a daemon thread and hot-reload edits made
+        outside this process (our own writes are recognised by content).
+        Parsed configs go to on_reload if set (called on the watcher thread;
+        the GUI only queues them for poll_ui), else straight to reload_config.
+        """
+        if self._watcher:
+            return
+        self._watcher = threading.Thread(target=self._watch_loop, args=(interval,), daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self, interval: float):
+        last = None
+        while True:
+            try:
+                st = os.stat(CONFIG_FILE)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stamp = None
+            if stamp and last and stamp != last:
+                try:
+                    with open(CONFIG_FILE, "r") as f:
+                        text = f.read()
+                    if text != self.config_writer.written:
+                        d = json.loads(text)
+                        self.config_writer.written = text
+                        if self.on_reload:
+                            self.on_reload(d)
+                        else:
+                            print(f"\nConfig reloaded in {self.reload_config(d):.1f} ms")
+                except ValueError as e:
+                    # Usually an editor halfway through saving; the next change retries
+                    print(f"Config reload skipped: {e}")
+                except Exception as e:
+                    print(f"Config reload error: {e}")
+            last = stamp
+            time.sleep(interval)
+
+    def save_config(self):
+        """Queue the current config on the debounced background writer."""
+        try:
+            di = None
+            if self.device_info:
+                di = {
+                    "vid": int(self.device_info.get("vid") or 0),
+                    "pid": int(self.device_info.get("pid") or 0),
+                    "iface": self.device_info.get("iface"),
+                }
+            # Copies: the writer serializes them later, on its own thread
+            cfg = {
+                "mappings": dict(self.mappings),
+                "settings": dict(self.settings),
+                "device_info": di,
+            }
+            if self.extra_devices:
+                cfg["devices"] = [dict(dev) for dev in self.extra_devices]
+            self.config_writer.submit(cfg)
+        except Exception as e:
+            print(f"Config save error: {e}")
+
+    # --- Devices ------------------------------------------------------------
+
+    def match_saved_device(self, info):
+        for d in require_hid().enumerate(info.get('vid'), info.get('pid')):
+            iface = d.get('interface_number', -1)
+            if iface == info.get('iface') or info.get('iface') is None:
+                return d['path']
+        return None
+
+    def open_extra_devices(self) -> list:
+        """HidSource for every configured extra device that is plugged in."""
+        sources = []
+        for info in self.extra_devices:
+            try:
+                path = self.match_saved_device(info)
+                if path:
+                    sources.append(HidSource(path))
+                    continue
+            except Exception as e:
+                print(f"Extra device error: {e}")
+            print(f"Extra device VID 0x{info.get('vid') or 0:04X} PID 0x{info.get('pid') or 0:04X} not found")
+        return sources
+
+    def scan_devices(self, fresh: bool = False):
+        """
+        Score every HID device by analog header presence; best first. Results
+        come from the probe cache while the enumerate set is unchanged, it
+        knows an analog device (fresh=True ignores it) and the cached pick
+        still opens (one that fails is dropped from the cache). Otherwise every
+        device is probed in parallel, previously good ones first, and the cache
+        saved; with an unchanged set, a device that opens but stays silent (an
+        idle keyboard) keeps its cached hits.
+        """
+        start = time.perf_counter()
+        items = [{
+            'vid': d.get('vendor_id'),
+            'pid': d.get('product_id'),
+            'iface': d.get('interface_number', -1),
+            'path': d.get('path'),
+            'product': d.get('product_string') or "",
+            'manufacturer': d.get('manufacturer_string') or "",
+        } for d in require_hid().enumerate()]
+        cache, valid = load_probe_cache([device_fingerprint(it) for it in items])
+        known = [cache.get(device_fingerprint(it)) for it in items]
+        cached = valid and not fresh and any(e and e.get("hits") for e in known)
+        if cached:
+            # The cached pick must still open; idle keyboards send nothing, so no sampling
+            best = max(range(len(items)), key=lambda n: (known[n] or {}).get("hits") or 0)
+            check = probe_hid(dict(items[best]), 0)
+            if check['status'] != 'ok':
+                print(f"Cached device VID 0x{items[best]['vid'] or 0:04X} failed to open, probing all")
+                cache.pop(device_fingerprint(items[best]), None)
+                known[best] = None
+                cached = False
+        if cached:
+            for item, entry in zip(items, known):
+                entry = entry or {}
+                item['hits'] = entry.get("hits", 0)
+                item['reports'] = entry.get("reports", 0)
+                item['size'] = entry.get("size", 0)
+                item['status'] = 'cached'
+                item['probe_ms'] = 0.0
+        else:
+            order = sorted(range(len(items)), key=lambda n: -((known[n] or {}).get("hits") or 0))
+            probe_devices([items[n] for n in order])
+            previous = cache if valid else {}
+            save_probe_cache(items, previous)
+            for item in items:
+                entry = previous.get(device_fingerprint(item))
+                if item['status'] == 'ok' and not item['hits'] and entry and entry.get("hits"):
+                    item['hits'] = entry["hits"]  # idle during the window, analog before
+
+        scored = []
+        for item in items:
+            score = 0
+            if item['hits']:
+                score += 10  # Has the analog header we expect
+            scored.append((score, item))
+        # Ties: devices that sent anything at all first, then a stable order
+        scored.sort(key=lambda x: (-x[0], -x[1]['reports'], x[1]['vid'], x[1]['pid'], x[1]['iface']))
+
+        self.scan_ms = (time.perf_counter() - start) * 1000
+        timeouts = sum(1 for _, it in scored if it['status'] == 'timeout')
+        print(f"{'Cached' if cached else 'Probed'} {len(items)} HID devices in {self.scan_ms:.0f} ms"
+              + (f" ({timeouts} timed out)" if timeouts else ""))
+        return scored
+
+
+    # --- Run ----------------------------------------------------------------
+
+    def start(self, sources: list, threaded: bool = True):
+        """
+        Attach the sources (primary first) and start the output thread and one
+        reader per device; with threaded=False the caller runs read_loop() for
+        the primary device itself.
+        """
+        self.slots = []
+        for i, source in enumerate(sources):
+            slot = DeviceSlot(i, source, self.processor if i == 0 else None, self.device_mappings(i))
+            if self.metrics and len(sources) > 1:
+                slot.metrics = LatencyStats()
+            self.slots.append(slot)
+        self.device = sources[0]
+        self.apply_mappings(self.processor_config())
+        self.recorder = recorder_from_cli()
+        self.running = True
+        self.finished = False
+        self.started_at = time.perf_counter()
+        for pad in self.pads:
+            self.start_pad(pad)
+        for slot in self.slots[0 if threaded else 1:]:
+            slot.thread = threading.Thread(target=self.read_loop, args=(slot,), daemon=True)
+            slot.thread.start()
+
+    def report_ready(self):
+        """
+        Front ends call this once a session is running: the first call of the
+        process prints launch -> ready (benches starting engines stay quiet).
+        """
+        global ready_ms
+        if not ready_ms:
+            ready_ms = (time.perf_counter_ns() - LAUNCH_NS) / 1e6
+            print(f"Ready {ready_ms:.0f} ms after launch (device scan {self.scan_ms:.0f} ms)")
+
+    def start_pad(self, pad: PadOutput):
+        """Output thread of one pad (threaded output modes; kept across sessions)."""
+        if self.output_mode == "direct" or (pad.thread and pad.thread.is_alive()):
+            return
+        loop = self.fixed_rate_loop if pad.scheduler else self.gamepad_loop
+        pad.thread = threading.Thread(target=loop, args=(pad,), daemon=True)
+        pad.thread.start()
+
+    def stop(self):
+        """Stop reading, close sources/recorder and center the pad."""
+        self.running = False
+        # A blocking read may be in flight; let it time out before closing the handle
+        for slot in self.slots:
+            if slot.thread and slot.thread is not threading.current_thread():
+                slot.thread.join(READ_TIMEOUT_MS / 1000 + 0.1)
+            slot.thread = None
+            try:
+                slot.source.close()
+            except:
+                pass
+            slot.processor.reset()
+        self.device = None
+        if self.recorder:
+            self.recorder.close()
+            print(f" Recorded {self.recorder.count} reports to {self.recorder.path}")
+            self.recorder = None
+        json_path = cli_value("--latency-json", "")
+        if self.metrics and json_path:
+            try:
+                self.metrics.dump_json(json_path)
+            except OSError as e:
+                print(f"Latency dump error: {e}")
+
+        self.processor.reset()
+        self.aggregator = AxisAggregator(self.action_table, (), len(self.aggregator.values) // len(AXIS_NAMES))
+
+        for pad in self.pads:
+            try:
+                pad.gamepad.reset()
+            except:
+                pass
+            pad.axis_buffer.clear()
+            pad.event.set()
+
+    @property
+    def total_reports(self) -> int:
+        return sum(slot.reports for slot in self.slots)
+
+    def read_loop(self, slot: DeviceSlot = None):
+        slot = slot or self.slots[0]
+        primary = slot.index == 0
+        last_stats = time.perf_counter()
+        batcher = slot.batcher = ReportBatcher(MAX_BATCH if self.batch_mode else 1)
+        if primary:
+            # Capture files hold one device's stream
+            self.batcher = batcher
+            batcher.recorder = self.recorder
+        source, processor, base = slot.source, slot.processor, slot.base
+        lock = self.lock
+        last_step = 0
+
+        while self.running:
+            try:
+                settling = processor.settling
+                n = read_batch(batcher, source, self.reader_mode, self.spin_sleep,
+                               FILTER_STEP_MS if settling else READ_TIMEOUT_MS)
+                active = self.active
+                if processor.config is not active.processor:
+                    processor.use(active.processor)  # new settings, installed by this reader
+                stepped = 0
+                if settling:
+                    # Held keys with the filter still moving: step them without new reports
+                    step = time.perf_counter_ns()
+                    if step - last_step >= FILTER_STEP_MS * 1_000_000:
+                        last_step = step
+                        stepped = batcher.settle(processor)
+
+                if n or stepped:
+                    slot.reports += n
+
+                    metrics = self.metrics
+                    stamp = processed = emit = 0
+                    if metrics and n:
+                        stamp = time.perf_counter_ns()
+                    batcher.process(processor)
+                    with lock:
+                        if self.active is not active:
+                            # Config swapped while processing: undo the filter step
+                            # and redo the batch with the new one
+                            processor.rewind(batcher.touched, active.processor)
+                            active = self.active
+                            processor.use(active.processor)
+                            batcher.process(processor)
+                        changed = batcher.aggregate(self.aggregator, base)
+                        if stamp:
+                            processed = time.perf_counter_ns()
+                            metrics.process.record(processed - stamp)
+                            if slot.metrics:
+                                slot.metrics.process.record(processed - stamp)
+                        if changed:
+                            emit = self.update_gamepad(stamp, processed, slot, changed)
+                    if emit:
+                        self.emit_direct(slot.handoff, emit, stamp, processed, slot)
+                elif source.finished:
+                    if not primary:
+                        break
+                    if all(s.source.finished for s in self.slots):
+                        self.finished = True
+                        if self.on_finished:
+                            self.on_finished()
+                        break
+                    time.sleep(0.01)
+                elif not primary:
+                    continue
+
+                now = time.perf_counter()
+                if primary and self.on_stats and now - last_stats > self.stats_interval:
+                    elapsed = now - last_stats
+                    last_stats = now
+                    for s in self.slots:
+                        reports = s.reports
+                        s.pps = (reports - s._last_reports) / elapsed
+                        s._last_reports = reports
+                    self.on_stats(sum(s.pps for s in self.slots))
 
-# --- MAPA DE TECLAS ---
-HID_MAP = {
-    0x29: "ESC", 0x3A: "F1", 0x3B: "F2", 0x3C: "F3", 0x3D: "F4", 0x3E: "F5", 0x3F: "F6", 0x40: "F7", 0x41: "F8", 0x42: "F9", 0x43: "F10", 0x44: "F11", 0x45: "F12",
-    0x35: "`", 0x1E: "1", 0x1F: "2", 0x20: "3", 0x21: "4", 0x22: "5", 0x23: "6", 0x24: "7", 0x25: "8", 0x26: "9", 0x27: "0", 0x2D: "-", 0x2E: "=", 0x2A: "BACK",
-    0x2B: "TAB", 0x14: "Q", 0x1A: "W", 0x08: "E", 0x15: "R", 0x17: "T", 0x1C: "Y", 0x18: "U", 0x0C: "I", 0x12: "O", 0x13: "P", 0x2F: "[", 0x30: "]", 0x31: "\\",
-    0x39: "CAPS", 0x04: "A", 0x16: "S", 0x07: "D", 0x09: "F", 0x0A: "G", 0x0B: "H", 0x0D: "J", 0x0E: "K", 0x0F: "L", 0x33: ";", 0x34: "'", 0x28: "ENTER",
-    0xE1: "LSHFT", 0x1D: "Z", 0x1B: "X", 0x06: "C", 0x19: "V", 0x05: "B", 0x11: "N", 0x10: "M", 0x36: ",", 0x37: ".", 0x38: "/", 0xE5: "RSHFT",
-    0xE0: "CTRL", 0xE2: "WIN", 0xE3: "ALT", 0x2C: "SPACE", 0xE6: "RALT", 0xE7: "FN", 0x65: "MENU", 0xE4: "RCTRL"
-}
-NAME_TO_HID = {v: k for k, v in HID_MAP.items()}
+            except Exception as e:
+                if self.running:
+                    print(f"Read error ({slot.describe()}): {e}")
+                    time.sleep(0.1)
 
-CONTROLLER_ACTIONS = [
-    "None",
-    "Right Trigger (RT) - Accelerate",
-    "Left Trigger (LT) - Brake",
-    "Left Stick: UP (Y+)",
-    "Left Stick: DOWN (Y-)",
-    "Left Stick: LEFT (X-)",
-    "Left Stick: RIGHT (X+)",
-    "Right Stick: UP",
-    "Right Stick: DOWN",
-    "Right Stick: LEFT",
-    "Right Stick: RIGHT",
-    "Button A", "Button B", "Button X", "Button Y"
-]
+    def update_gamepad(self, stamp: int = 0, processed: int = 0, slot: DeviceSlot = None,
+                       mask: int = -1, handoff: DirectHandoff = None) -> int:
+        """
+        Hand the aggregated axes of the pads in mask to their outputs (callers
+        hold self.lock); stamps are read/process ns for --latency, slot the
+        device that caused it. Threaded modes publish to the pad thread here.
+        Direct mode only copies the axes into handoff (default: slot's) and
+        returns the mask of pads the caller must emit_direct() once the lock
+        is released.
+        """
+        metrics = self.metrics
+        smetrics = slot.metrics if slot else None
+        values = self.aggregator.values
+        direct = self.output_mode == "direct"
+        if direct and handoff is None:
+            handoff = slot.handoff
+        emit = 0
+        for pad in self.pads:
+            if not mask >> pad.index & 1:
+                continue
+            base = pad.base
+            if base >= len(values):
+                break
 
-LEGACY_TO_ENGLISH = {
-    "Ninguna": "None",
-    "Gatillo Derecho (RT) - Acelerar": "Right Trigger (RT) - Accelerate",
-    "Gatillo Izquierdo (LT) - Frenar": "Left Trigger (LT) - Brake",
-    "Stick Izquierdo: ARRIBA (Y+)": "Left Stick: UP (Y+)",
-    "Stick Izquierdo: ABAJO (Y-)": "Left Stick: DOWN (Y-)",
-    "Stick Izquierdo: IZQUIERDA (X-)": "Left Stick: LEFT (X-)",
-    "Stick Izquierdo: DERECHA (X+)": "Left Stick: RIGHT (X+)",
-    "Stick Derecho: ARRIBA": "Right Stick: UP",
-    "Stick Derecho: ABAJO": "Right Stick: DOWN",
-    "Stick Derecho: IZQUIERDA": "Right Stick: LEFT",
-    "Stick Derecho: DERECHA": "Right Stick: RIGHT",
-    "Bot?n A": "Button A",
-    "Bot?n B": "Button B",
-    "Bot?n X": "Button X",
-    "Bot?n Y": "Button Y",
-}
+            if direct:
+                pad.seq += 1
+                handoff.seqs[pad.index] = pad.seq
+                axes = handoff.axes
+                for i in AXIS_SLOTS:
+                    axes[base + i] = values[base + i]
+                emit |= 1 << pad.index
+                continue
 
+            now = 0
+            if metrics and stamp:
+                now = time.perf_counter_ns()
+            if not pad.axis_buffer.publish(values, stamp, now, slot.index if slot else 0, base):
+                continue
 
-def translate_actions(mapping: Dict[str, str]) -> Dict[str, str]:
-    """Map legacy Spanish action labels to English equivalents."""
-    return {k: LEGACY_TO_ENGLISH.get(v, v) for k, v in mapping.items()}
+            if now:
+                metrics.publish.record(now - processed)
+                if smetrics:
+                    smetrics.publish.record(now - processed)
+            pad.event.set()
+        return emit
 
+    def emit_direct(self, handoff: DirectHandoff, mask: int, stamp: int = 0, processed: int = 0,
+                    slot: DeviceSlot = None):
+        """
+        Direct mode, outside self.lock: emit the pads in mask from handoff on
+        the calling thread. Each pad has its own emit_lock, so readers feeding
+        different pads emit in parallel; a copy older than what the pad already
+        sent is dropped.
+        """
+        axes = handoff.axes
+        for pad in self.pads:
+            if not mask >> pad.index & 1:
+                continue
+            base = pad.base
+            with pad.emit_lock:
+                seq = handoff.seqs[pad.index]
+                if seq <= pad.emitted:
+                    continue  # another reader already sent a newer state
+                pad.emitted = seq
+                published = time.perf_counter_ns() if stamp else 0
+                try:
+                    emit_axes(pad.gamepad, axes[base], axes[base + 1], axes[base + 2],
+                              axes[base + 3], axes[base + 4], axes[base + 5])
+                except:
+                    pass
+            if stamp and self.metrics:
+                self.record_output((stamp, published, slot.index if slot else 0), processed)
 
-# ============================================================================
-# PROCESAMIENTO DIRECTO - Sin filtros que a?adan latencia
-# ============================================================================
-@dataclass
-class KeyState:
-    """Estado de una tecla."""
-    raw: int = 0
-    filtered: float = 0.0
+    def record_output(self, stamps, processed: int = 0):
+        """
+        Output/total latency of an emit (pad thread, or direct mode with
+        processed for the publish stage), for the device in stamps[2].
+        """
+        now = time.perf_counter_ns()
+        with self.lock:
+            if processed:
+                self.metrics.publish.record(stamps[1] - processed)
+                slots = self.slots
+                if stamps[2] < len(slots) and slots[stamps[2]].metrics:
+                    slots[stamps[2]].metrics.publish.record(stamps[1] - processed)
+            self.metrics.output.record(now - stamps[1])
+            self.metrics.total.record(now - stamps[0])
+            slots = self.slots
+            if stamps[2] < len(slots) and slots[stamps[2]].metrics:
+                slots[stamps[2]].metrics.output.record(now - stamps[1])
+                slots[stamps[2]].metrics.total.record(now - stamps[0])
 
+    def gamepad_loop(self, pad: PadOutput):
+        buf = pad.axis_buffer
+        prev = pad.prev_axes
+        event = pad.event
+        targets = array('d', bytes(8 * len(AXIS_SLOTS)))
+        stamps = array('q', bytes(8 * AxisBuffer.STAMPS))
+        seen = 0
+        while True:
+            event.wait(0.005)
+            event.clear()
 
-class SignalProcessor:
-    """Procesador de se?ales DIRECTO - m?nima latencia."""
-    
-    def __init__(self):
-        self.keys: Dict[int, KeyState] = {}
-        self.curve = "linear"
-        self.deadzone = 30
-        self.sensitivity = 1.0
-        self.max_pressure = 600
-        
-    def get_state(self, key: int) -> KeyState:
-        if key not in self.keys:
-            self.keys[key] = KeyState()
-        return self.keys[key]
-    
-    def process(self, key: int, raw: int) -> float:
+            seq = buf.read_into(targets, stamps)
+
+            try:
+                sent = emit_interpolated(pad.gamepad, prev, targets)
+            except:
+                sent = -1
+            if not sent:
+                if not self.running:
+                    time.sleep(0.01)
+                continue
+
+            if seq != seen and stamps[0] and self.metrics:
+                self.record_output(stamps)
+            seen = seq
+            prev[:] = targets
+
+    def fixed_rate_loop(self, pad: PadOutput):
+        sched = pad.scheduler
+        buf = pad.axis_buffer
+        targets = array('d', bytes(8 * len(AXIS_SLOTS)))
+        stamps = array('q', bytes(8 * AxisBuffer.STAMPS))
+        seen = 0
+        sched.restart()
+        while True:
+            if not self.running and buf.seq == seen:
+                # Idle between sessions: no ticks, pick up the clock on resume
+                time.sleep(0.01)
+                sched.restart()
+                continue
+
+            sched.wait()
+            if buf.seq == seen:
+                continue
+
+            # Everything published since the last tick goes out as one update()
+            seq = buf.read_into(targets, stamps)
+            try:
+                if emit_axes(pad.gamepad, *targets):
+                    sched.emitted += 1
+            except:
+                pass
+
+            if stamps[0] and self.metrics:
+                self.record_output(stamps)
+            seen = seq
+            pad.prev_axes[:] = targets
+
+    def output_axes(self):
+        """Pad 1: last axes handed to it (threaded output modes) or the aggregated ones, AXIS_* order."""
+        if self.output_mode != "direct" and self.pads:
+            return self.pads[0].prev_axes
+        return self.aggregator.values
+
+    def ui_snapshot(self) -> UiSnapshot:
         """
-        Procesamiento DIRECTO sin filtros:
-        1. Aplica deadzone
-        2. Normaliza [0, 1]
-        3. Aplica curva
-        4. Retorna inmediatamente
+        State for a UI frame, copied on the caller's thread without the engine
+        lock: each field is read whole, but fields may come from consecutive
+        packets (fine for display).
         """
-        state = self.get_state(key)
-        state.raw = raw
-        
-        # Deadzone (opcional). Por defecto 0 para m?ximo recorrido.
-        if raw <= self.deadzone:
-            state.filtered = 0.0
-            return 0.0
+        store = self.processor.store
+        active = bytes(store.active)
+        raw, filtered = store.raw, store.filtered
+        keys = {code: (raw[code], filtered[code]) for code in KeyStateStore.bit_codes(active)}
+        device_reports = tuple(slot.reports for slot in self.slots)
+        return UiSnapshot(tuple(self.output_axes()), active, keys, sum(device_reports),
+                          device_reports, self.finished)
 
-        # Normalizar directo al rango completo (0..max_pressure)
-        # Permite valores mayores a max_pressure pero se saturan al 100%.
-        norm = raw / self.max_pressure if self.max_pressure > 0 else 1.0
-        norm = min(1.0, max(0.0, norm))
-        
-        # Curva de respuesta
-        curved = self.apply_curve(norm)
-        
-        # Sensibilidad
-        final = min(1.0, curved * self.sensitivity)
-        state.filtered = final
-        return final
-    
-    def apply_curve(self, x: float) -> float:
-        if self.curve == "linear":
-            return x
-        elif self.curve == "exponential":
-            return x * x
-        elif self.curve == "scurve":
-            return 3*x*x - 2*x*x*x
-        elif self.curve == "fast":
-            return 1 - (1-x)*(1-x)
-        elif self.curve == "aggressive":
-            return min(1.0, x * 1.5) if x < 0.7 else 1.0
-        return x
-    
-    def clear(self, key: int):
-        if key in self.keys:
-            self.keys[key].raw = 0
-            self.keys[key].filtered = 0.0
+    def output_summary(self) -> list:
+        """One line per pad: sent/suppressed updates and, with --output fixed, ticks."""
+        lines = []
+        for pad in self.pads:
+            line = f"{pad.describe()}: {pad.gamepad.updates} sent / {pad.gamepad.suppressed} suppressed"
+            if pad.scheduler:
+                line += f" | {pad.scheduler.short()}"
+            lines.append(line)
+        return lines
 
 
 # ============================================================================
 # APLICACI?N PRINCIPAL
 # ============================================================================
 
-class HallMapperApp(ctk.CTk):
+class HallMapperApp:
+    """
+    GUI front end. Mixed into ctk.CTk by run_gui(), so customtkinter is only
+    imported when the window is actually opened.
+    """
+
     def __init__(self):
         super().__init__()
         self.title("Hall Analog Mapper")
@@ -158,35 +2555,32 @@ class HallMapperApp(ctk.CTk):
         ctk.set_appearance_mode("Dark")
         ctk.set_default_color_theme("green")
 
-        self.running = False
-        self.device = None
-        self.gamepad = None
-        self.mappings = {}
-        self.active_keys = {}
+        self.engine = MappingEngine(output_mode_from_cli("interpolated"))
         self.buttons_ui = {}
         self.selected_key_code = None
-        self.device_info = None  # {'vid': int, 'pid': int, 'iface': int}
-        
-        # Low-latency signal processor
-        self.processor = SignalProcessor()
-        
-        self.settings = {
-            "deadzone": 0,
-            "sensitivity": 1.0,
-            "max_pressure": 1600,
-            "curve": "linear"
-        }
         # Fast mode: skip most UI refresh work
         self.fast_mode = ("--fast" in sys.argv) or ("-f" in sys.argv)
-        # Previous state for micro-interpolation
-        self.prev_axes = {"lx": 0.0, "ly": 0.0, "rx": 0.0, "ry": 0.0, "lt": 0.0, "rt": 0.0}
-        # Target state for the gamepad thread
-        self.target_axes = {"lx": 0.0, "ly": 0.0, "rx": 0.0, "ry": 0.0, "lt": 0.0, "rt": 0.0}
-        self.pad_event = threading.Event()
-        self.pad_thread = None
-        self._last_visual_sig = None
-        self.load_config()
-        self.sync_processor()
+        if self.fast_mode:
+            self.engine.spin_sleep = 0.0
+        # The Tk thread polls engine.ui_snapshot() on its own clock (poll_ui);
+        # reader threads never touch Tk. Fast mode only polls for stats.
+        fps = ui_fps_from_cli()
+        self.ui_interval = 1.0 / max(1.0, 4.0 if self.fast_mode else fps)
+        self.ui_frames = 0
+        self.ui_dropped = 0  # frames skipped because the previous ones ran late
+        self._ui_next = 0.0
+        self._ui_shown = None  # (reports, axes) of the last rendered frame
+        self._ui_stats_at = 0.0
+        self._ui_stats_reports = ()
+        self._key_styles = {}  # code -> (fg_color, text_color) last applied
+        self._shown_active = bytes(32)
+        # Configs parsed by the watcher thread, applied by poll_ui on the Tk thread
+        self._reloads = collections.deque()
+        self.engine.load_config()
+        self.engine.sync_processor()
+        self.engine.on_reload = self._reloads.append
+        self.engine.watch_config()
+        self.sliders = {}  # settings key -> (slider, label, text, fmt, dtype)
 
         # Layout: left fixed panel, right vertically scrollable panel (mouse wheel), no visible bar
         self.grid_rowconfigure(0, weight=1)
@@ -208,10 +2602,12 @@ class HallMapperApp(ctk.CTk):
         self.build_right()
         
         try:
-            self.gamepad = vg.VX360Gamepad()
+            self.engine.open_pads(sink_from_cli)
         except Exception as e:
             print(f"ViGEm error: {e}")
 
+        self.after(0, self.poll_ui)
+
         # Auto connect shortly after boot
         self.after(200, self.auto_connect)
 
@@ -228,15 +2624,8 @@ class HallMapperApp(ctk.CTk):
         delta = -1 * int(event.delta / 120)
         self.right_canvas.yview_scroll(delta, "units")
 
-    def sync_processor(self):
-        """Sincroniza settings con el procesador de se?ales."""
-        self.processor.deadzone = self.settings["deadzone"]
-        self.processor.sensitivity = self.settings["sensitivity"]
-        self.processor.max_pressure = self.settings["max_pressure"]
-        self.processor.curve = self.settings.get("curve", "linear")
-
     def auto_connect(self):
-        if not self.running:
+        if not self.engine.running:
             self.connect(auto=True)
 
     def build_left(self):
@@ -319,12 +2708,24 @@ class HallMapperApp(ctk.CTk):
         self.combo_action.pack(pady=10)
         self.combo_action.configure(state="disabled")
 
+        # Target virtual pad of the selected key's action
+        self.pad_var = ctk.StringVar(value="Pad 1")
+        self.combo_pad = ctk.CTkComboBox(
+            self.right_panel,
+            values=[f"Pad {i + 1}" for i in range(MAX_PADS)],
+            variable=self.pad_var,
+            command=lambda _: self.on_action_change(self.action_var.get()),
+            width=250,
+            state="disabled"
+        )
+        self.combo_pad.pack(pady=(0, 10))
+
         ctk.CTkFrame(self.right_panel, height=2, fg_color="#333").pack(fill="x", padx=20, pady=15)
         
         # Config sliders
-        self.create_slider(" Deadzone", 0, 200, self.settings["deadzone"], "deadzone", int)
-        self.create_slider(" Sensitivity", 0.5, 2.0, self.settings["sensitivity"], "sensitivity", float)
-        self.create_slider(" Max Pressure", 200, 2000, self.settings["max_pressure"], "max_pressure", int)
+        self.create_slider(" Deadzone", 0, 200, self.engine.settings["deadzone"], "deadzone", int)
+        self.create_slider(" Sensitivity", 0.5, 2.0, self.engine.settings["sensitivity"], "sensitivity", float)
+        self.create_slider(" Max Pressure", 200, 2000, self.engine.settings["max_pressure"], "max_pressure", int)
         
         ctk.CTkFrame(self.right_panel, height=2, fg_color="#333").pack(fill="x", padx=20, pady=15)
         
@@ -335,7 +2736,7 @@ class HallMapperApp(ctk.CTk):
             font=("Arial", 12, "bold")
         ).pack(pady=5)
         
-        self.curve_var = ctk.StringVar(value=self.settings.get("curve", "linear"))
+        self.curve_var = ctk.StringVar(value=self.engine.settings.get("curve", "linear"))
         curves = [
             ("Linear (1:1)", "linear"),
             ("Exponential (precise)", "exponential"),
@@ -353,6 +2754,32 @@ class HallMapperApp(ctk.CTk):
             ).pack(anchor="w", padx=30, pady=2)
 
         ctk.CTkFrame(self.right_panel, height=2, fg_color="#333").pack(fill="x", padx=20, pady=15)
+
+        # Smoothing filter (adds lag; compare with --bench-filters)
+        ctk.CTkLabel(
+            self.right_panel,
+            text=" Smoothing Filter",
+            font=("Arial", 12, "bold")
+        ).pack(pady=5)
+
+        self.filter_var = ctk.StringVar(value=self.engine.settings.get("filter", "none"))
+        filters = [
+            ("Off (lowest latency)", "none"),
+            ("EMA (fixed cutoff)", "ema"),
+            ("One Euro (adaptive)", "oneeuro")
+        ]
+        for text, val in filters:
+            ctk.CTkRadioButton(
+                self.right_panel,
+                text=text,
+                variable=self.filter_var,
+                value=val,
+                command=self.on_filter_change
+            ).pack(anchor="w", padx=30, pady=2)
+        self.create_slider(" Filter cutoff (Hz)", 0.5, 30.0, self.engine.settings.get("filter_cutoff", 5.0), "filter_cutoff", float)
+        self.create_slider(" Filter beta", 0.0, 5.0, self.engine.settings.get("filter_beta", 1.0), "filter_beta", float)
+
+        ctk.CTkFrame(self.right_panel, height=2, fg_color="#333").pack(fill="x", padx=20, pady=15)
         
         # Live monitor
         ctk.CTkLabel(
@@ -366,6 +2793,16 @@ class HallMapperApp(ctk.CTk):
         self.bars['lt'] = self.create_bar(" Brake (LT)", "#e74c3c")
         self.bars['lx'] = self.create_bar(" Steering", "#3498db", center=True)
 
+        # Read -> gamepad.update() latency (only filled with --latency)
+        self.lbl_latency = ctk.CTkLabel(
+            self.right_panel,
+            text="" if self.engine.metrics is None else "Latency: waiting for input",
+            font=("Consolas", 9),
+            text_color="#8e8e8e",
+            justify="left"
+        )
+        self.lbl_latency.pack(padx=20, pady=(6, 0), anchor="w")
+
         # Quick test area to measure real lag
         test_frame = ctk.CTkFrame(self.right_panel, fg_color="transparent")
         test_frame.pack(fill="x", padx=20, pady=(10, 4))
@@ -397,14 +2834,15 @@ class HallMapperApp(ctk.CTk):
         
         def cb(v):
             val = dtype(v)
-            self.settings[key] = val
+            self.engine.settings[key] = val
             lbl.configure(text=f"{text}: {fmt.format(val)}")
-            self.sync_processor()
-            self.save_config()
+            self.engine.sync_processor()
+            self.engine.save_config()
         
         slider = ctk.CTkSlider(frame, from_=min_v, to=max_v, command=cb)
         slider.set(default)
         slider.pack(fill="x")
+        self.sliders[key] = (slider, lbl, text, fmt, dtype)
 
     def create_bar(self, text, color, center=False):
         frame = ctk.CTkFrame(self.right_panel, fg_color="transparent")
@@ -458,89 +2896,90 @@ class HallMapperApp(ctk.CTk):
         self.selected_key_code = code
         self.lbl_selected_key.configure(text=f" Editing: {name}")
         self.combo_action.configure(state="readonly")
-        self.action_var.set(self.mappings.get(str(code), "None"))
+        self.combo_pad.configure(state="readonly")
+        pad, action = split_pad_action(self.engine.mappings.get(str(code), "None"))
+        self.action_var.set(action)
+        self.pad_var.set(f"Pad {pad + 1}")
         self.refresh_visuals(force=True)
 
     def on_action_change(self, choice):
         if self.selected_key_code:
-            if choice == "None":
-                self.mappings.pop(str(self.selected_key_code), None)
-            else:
-                self.mappings[str(self.selected_key_code)] = choice
-            self.save_config()
+            pad = int(self.pad_var.get().split()[-1]) - 1
+            self.engine.set_mapping(self.selected_key_code, pad_action(pad, choice))
+            self.engine.save_config()
             self.refresh_visuals(force=True)
 
     def on_curve_change(self):
-        self.settings["curve"] = self.curve_var.get()
-        self.sync_processor()
-        self.save_config()
-
-    def refresh_visuals(self, force: bool = False):
-        sig = (
-            self.selected_key_code,
-            tuple(sorted(self.mappings.keys())),
-            tuple(sorted((code, min(255, int(val // 8))) for code, val in self.active_keys.items()))
-        )
-        if not force and sig == self._last_visual_sig:
-            return
-        self._last_visual_sig = sig
-
-        for code, btn in self.buttons_ui.items():
-            if code in self.active_keys:
-                intensity = min(1.0, self.active_keys[code] / 400)
-                r = int(46 + intensity * 46)
-                g = int(204 - intensity * 50)
-                b = int(113 - intensity * 50)
-                btn.configure(fg_color=f"#{r:02x}{g:02x}{b:02x}", text_color="black")
-            elif code == self.selected_key_code:
-                btn.configure(fg_color="#f39c12", text_color="black")
-            elif str(code) in self.mappings:
-                btn.configure(fg_color="#2980b9", text_color="white")
-            else:
-                btn.configure(fg_color="#2c3e50", text_color="white")
+        self.engine.settings["curve"] = self.curve_var.get()
+        self.engine.sync_processor()
+        self.engine.save_config()
 
-    def load_config(self):
-        try:
-            cfg_path = CONFIG_FILE if os.path.exists(CONFIG_FILE) else LEGACY_CONFIG_FILE
-            if os.path.exists(cfg_path):
-                with open(cfg_path, "r") as f:
-                    d = json.load(f)
-                    self.mappings = translate_actions(d.get("mappings", d.get("Mappings", {})))
-                    s = d.get("settings", d.get("Settings", {}))
-                    self.settings["deadzone"] = s.get("deadzone", s.get("Deadzone", 30))
-                    self.settings["sensitivity"] = s.get("sensitivity", s.get("Sensitivity", 1.0))
-                    self.settings["max_pressure"] = s.get("max_pressure", s.get("MaxPressure", 600))
-                    self.settings["curve"] = s.get("curve", s.get("Curve", "linear"))
-                    di = d.get("device_info")
-                    if di:
-                        self.device_info = {
-                            "vid": di.get("vid"),
-                            "pid": di.get("pid"),
-                            "iface": di.get("iface"),
-                        }
-        except Exception as e:
-            print(f"Config load error: {e}")
+    def on_filter_change(self):
+        self.engine.settings["filter"] = self.filter_var.get()
+        self.engine.sync_processor()
+        self.engine.save_config()
 
-    def save_config(self):
-        try:
-            di = None
-            if self.device_info:
-                di = {
-                    "vid": int(self.device_info.get("vid") or 0),
-                    "pid": int(self.device_info.get("pid") or 0),
-                    "iface": self.device_info.get("iface"),
-                }
-            with open(CONFIG_FILE, "w") as f:
-                json.dump({
-                    "mappings": self.mappings,
-                    "settings": self.settings,
-                    "device_info": di,
-                }, f, indent=2)
-        except Exception as e:
-            print(f"Config save error: {e}")
+    def on_config_reload(self, d: dict):
+        """hall_config.json was edited outside the app: apply it and sync the controls."""
+        print(f"Config reloaded in {self.engine.reload_config(d):.1f} ms")
+        settings = self.engine.settings
+        for key, (slider, lbl, text, fmt, dtype) in self.sliders.items():
+            val = dtype(settings[key])
+            slider.set(val)
+            lbl.configure(text=f"{text}: {fmt.format(val)}")
+        self.curve_var.set(settings.get("curve", "linear"))
+        self.filter_var.set(settings.get("filter", "none"))
+        if self.selected_key_code:
+            pad, action = split_pad_action(self.engine.mappings.get(str(self.selected_key_code), "None"))
+            self.action_var.set(action)
+            self.pad_var.set(f"Pad {pad + 1}")
+        self.refresh_visuals(force=True)
+
+    def key_style(self, code: int, snap: UiSnapshot) -> tuple:
+        """(fg_color, text_color) of a key button."""
+        if code in snap.keys:
+            intensity = min(1.0, snap.keys[code][0] / 400)
+            r = int(46 + intensity * 46)
+            g = int(204 - intensity * 50)
+            b = int(113 - intensity * 50)
+            return f"#{r:02x}{g:02x}{b:02x}", "black"
+        if code == self.selected_key_code:
+            return "#f39c12", "black"
+        if str(code) in self.engine.mappings:
+            return "#2980b9", "white"
+        return "#2c3e50", "white"
+
+    def refresh_visuals(self, force: bool = False, snap: UiSnapshot = None):
+        """
+        Restyle only keys that can have changed: the held ones and those pressed
+        or released since the last frame, from the snapshot's active bitset
+        (force = every key, e.g. after a mapping or selection change). Buttons
+        whose style equals the one last applied are not touched (CTk configure
+        redraws the widget).
+        """
+        snap = snap or self.engine.ui_snapshot()
+        active = snap.active
+        if force:
+            codes = self.buttons_ui
+        else:
+            codes = KeyStateStore.bit_codes(active)
+            if active != self._shown_active:
+                flipped = bytes(a ^ b for a, b in zip(active, self._shown_active))
+                codes += KeyStateStore.bit_codes(flipped)
+        self._shown_active = active
+
+        styles = self._key_styles
+        for code in codes:
+            btn = self.buttons_ui.get(code)
+            if btn is None:
+                continue
+            style = self.key_style(code, snap)
+            if styles.get(code) != style:
+                styles[code] = style
+                btn.configure(fg_color=style[0], text_color=style[1])
 
     def toggle_connection(self):
-        if not self.running:
+        if not self.engine.running:
             self.connect()
         else:
             self.disconnect()
@@ -551,63 +2990,104 @@ class HallMapperApp(ctk.CTk):
 
     def connect(self, auto: bool = False, force_wizard: bool = False):
         try:
-            path = self.discover_device_path(auto=auto, force_wizard=force_wizard)
-            if not path:
-                if not auto:
-                    messagebox.showerror("Connection", "No analog HID keyboard detected")
-                return
-            
-            self.device = hid.device()
-            self.device.open_path(path)
-            self.device.set_nonblocking(True)
+            sources = sources_from_cli()
+            if not sources:
+                path = self.discover_device_path(auto=auto, force_wizard=force_wizard)
+                if not path:
+                    if not auto:
+                        messagebox.showerror("Connection", "No analog HID keyboard detected")
+                    return
+                
+                sources = [HidSource(path)] + self.engine.open_extra_devices()
             
-            self.running = True
+            self.engine.start(sources)
+            self.engine.report_ready()
             self.btn_connect.configure(text=" DISCONNECT", fg_color="#27ae60")
-            self.lbl_status.configure(text=" Connected", text_color="#2ecc71")
-            
-            threading.Thread(target=self.read_loop, daemon=True).start()
-            if not self.pad_thread or not self.pad_thread.is_alive():
-                self.pad_thread = threading.Thread(target=self.gamepad_loop, daemon=True)
-                self.pad_thread.start()
+            status = sources[0].describe()
+            if len(sources) > 1:
+                status += f" + {len(sources) - 1} more"
+            self.lbl_status.configure(text=f" {status}", text_color="#2ecc71")
             
         except Exception as e:
             if not auto:
                 messagebox.showerror("Connection error", str(e))
 
     def disconnect(self):
-        self.running = False
-        
-        if self.device:
-            try:
-                self.device.close()
-            except:
-                pass
-            self.device = None
-        
-        self.active_keys.clear()
-        self.processor.keys.clear()
-        self._last_visual_sig = None
-        
-        if self.gamepad:
-            try:
-                self.gamepad.left_trigger(0)
-                self.gamepad.right_trigger(0)
-                self.gamepad.left_joystick(0, 0)
-                self.gamepad.right_joystick(0, 0)
-                self.gamepad.update()
-            except:
-                pass
-        self.target_axes = {"lx": 0.0, "ly": 0.0, "rx": 0.0, "ry": 0.0, "lt": 0.0, "rt": 0.0}
-        self.pad_event.set()
+        self.engine.stop()
         
         self.btn_connect.configure(text=" CONNECT", fg_color="#c0392b")
         self.lbl_status.configure(text=" Disconnected", text_color="gray")
-        self.after(0, self.refresh_visuals)
+        self._ui_shown = None
+        self.refresh_visuals()
+
+    def poll_ui(self):
+        """
+        One UI frame on the Tk thread: snapshot the engine, render if anything
+        changed, refresh stats every stats_interval, then schedule the next
+        frame on a fixed grid. Frames the UI was too slow for are dropped
+        (counted in ui_dropped), never queued up. Configs queued by the file
+        watcher are applied here first (only the newest one).
+        """
+        engine = self.engine
+        if not self._ui_next:
+            self._ui_next = self._ui_stats_at = time.perf_counter()
+        if self._reloads:
+            d = None
+            while self._reloads:
+                d = self._reloads.popleft()
+            self.on_config_reload(d)
+        snap = engine.ui_snapshot()
+        if snap.finished and engine.running:
+            print(f"{engine.device.describe()}: finished")
+            self.disconnect()
+        elif not self.fast_mode:
+            shown = (snap.reports, snap.axes)
+            if shown != self._ui_shown:
+                self._ui_shown = shown
+                self.update_ui(snap)
+        now = time.perf_counter()
+        if now - self._ui_stats_at >= engine.stats_interval:
+            self.update_stats(snap, now)
+        self.ui_frames += 1
+
+        self._ui_next += self.ui_interval
+        now = time.perf_counter()
+        if now > self._ui_next:
+            late = int((now - self._ui_next) / self.ui_interval) + 1
+            self.ui_dropped += late
+            self._ui_next += late * self.ui_interval
+        self.after(max(1, int((self._ui_next - now) * 1000)), self.poll_ui)
+
+    def update_stats(self, snap: UiSnapshot, now: float):
+        """Stats and latency labels from report counter deltas (Tk thread)."""
+        engine = self.engine
+        elapsed = now - self._ui_stats_at
+        last = self._ui_stats_reports
+        rates = [
+            (reports - (last[i] if i < len(last) else 0)) / elapsed
+            for i, reports in enumerate(snap.device_reports)
+        ]
+        self._ui_stats_at = now
+        self._ui_stats_reports = snap.device_reports
+        if not engine.running:
+            return
+        text = f" {sum(rates):.0f} pkt/s | {len(snap.keys)} keys"
+        if len(rates) > 1:
+            text += " | " + ", ".join(f"#{i} {pps:.0f}" for i, pps in enumerate(rates))
+        if engine.batch_mode and engine.batcher:
+            text += " | " + format_batch_stats(engine.batcher.take_stats())
+        if engine.pads:
+            text += " | " + " | ".join(engine.output_summary())
+        if self.ui_dropped:
+            text += f" | UI dropped {self.ui_dropped}/{self.ui_frames} frames"
+        self.lbl_stats.configure(text=text)
+        if engine.metrics:
+            self.lbl_latency.configure(text="\n".join(engine.metrics.lines()))
 
     def discover_device_path(self, auto: bool = False, force_wizard: bool = False):
         # 1) If we have saved device info, try it first
-        if self.device_info and not force_wizard:
-            path = self._match_saved_device(self.device_info)
+        if self.engine.device_info and not force_wizard:
+            path = self.engine.match_saved_device(self.engine.device_info)
             if path:
                 return path
 
@@ -615,9 +3095,9 @@ class HallMapperApp(ctk.CTk):
         if auto and not force_wizard:
             best = self._auto_detect_by_scan()
             if best:
-                self.device_info = best
-                self.save_config()
-                return self._match_saved_device(best)
+                self.engine.device_info = best
+                self.engine.save_config()
+                return self.engine.match_saved_device(best)
 
         # 3) Assisted wizard (auto-detect by press or manual list)
         use_press = messagebox.askyesno(
@@ -630,87 +3110,33 @@ class HallMapperApp(ctk.CTk):
         if use_press:
             info = self._auto_detect_by_press()
         if not info:
-            info = self._wizard_select_device()
+            # Calibrate/Detect again: probe every device instead of trusting the cache
+            info = self._wizard_select_device(fresh=force_wizard)
         if info:
-            self.device_info = {
+            self.engine.device_info = {
                 "vid": info.get("vid"),
                 "pid": info.get("pid"),
                 "iface": info.get("iface"),
             }
-            self.save_config()
-            return self._match_saved_device(self.device_info)
-
-        return None
+            self.engine.save_config()
+            return self.engine.match_saved_device(self.engine.device_info)
 
-    def _match_saved_device(self, info):
-        for d in hid.enumerate(info.get('vid'), info.get('pid')):
-            iface = d.get('interface_number', -1)
-            if iface == info.get('iface') or info.get('iface') is None:
-                return d['path']
         return None
 
     def _auto_detect_by_scan(self):
-        """Headless-friendly scan that scores devices by analog header presence."""
-        scored = []
-        for d in hid.enumerate():
-            item = {
-                'vid': d.get('vendor_id'),
-                'pid': d.get('product_id'),
-                'iface': d.get('interface_number', -1),
-                'path': d.get('path'),
-            }
-            score = 0
-            try:
-                dev = hid.device()
-                dev.open_path(item['path'])
-                dev.set_nonblocking(True)
-                data = dev.read(64)
-                dev.close()
-                if data and len(data) > 0 and data[0] == 0xA0:
-                    score += 10
-            except:
-                pass
-            scored.append((score, item))
-
-        scored.sort(key=lambda x: (-x[0], x[1]['vid'], x[1]['pid'], x[1]['iface']))
-        if scored and scored[0][0] > 0:
-            top = scored[0][1]
-            return {"vid": top['vid'], "pid": top['pid'], "iface": top['iface']}
-        return None
-
-    def _wizard_select_device(self):
-        devices = []
-        for d in hid.enumerate():
-            devices.append({
-                'vid': d.get('vendor_id'),
-                'pid': d.get('product_id'),
-                'iface': d.get('interface_number', -1),
-                'path': d.get('path'),
-                'product': d.get('product_string') or "",
-                'manufacturer': d.get('manufacturer_string') or "",
-            })
-
-        scored = []
-        for item in devices:
-            score = 0
-            try:
-                dev = hid.device()
-                dev.open_path(item['path'])
-                dev.set_nonblocking(True)
-                data = dev.read(64)
-                dev.close()
-                if data and len(data) > 0 and data[0] == 0xA0:
-                    score += 10  # Has the analog header we expect
-            except:
-                pass
-            scored.append((score, item))
+        """Silent scan: best device only if it shows the analog header."""
+        scored = self.engine.scan_devices()
+        if scored and scored[0][0] > 0:
+            top = scored[0][1]
+            return {"vid": top['vid'], "pid": top['pid'], "iface": top['iface']}
+        return None
 
+    def _wizard_select_device(self, fresh: bool = False):
+        scored = self.engine.scan_devices(fresh=fresh)
         if not scored:
             messagebox.showerror("No devices", "No HID devices detected")
             return None
 
-        scored.sort(key=lambda x: (-x[0], x[1]['vid'], x[1]['pid'], x[1]['iface']))
-
         options = []
         for idx, (_, it) in enumerate(scored):
             options.append(f"{idx}: VID 0x{it['vid']:04X} PID 0x{it['pid']:04X} iface {it['iface']} - {it['manufacturer']} {it['product']}")
@@ -739,8 +3165,9 @@ class HallMapperApp(ctk.CTk):
             parent=self
         )
 
+        hidapi = require_hid()
         candidates = []
-        for d in hid.enumerate():
+        for d in hidapi.enumerate():
             candidates.append({
                 'vid': d.get('vendor_id'),
                 'pid': d.get('product_id'),
@@ -751,7 +3178,7 @@ class HallMapperApp(ctk.CTk):
         dev_handles = []
         for c in candidates:
             try:
-                dev = hid.device()
+                dev = hidapi.device()
                 dev.open_path(c['path'])
                 dev.set_nonblocking(True)
                 dev_handles.append((c, dev))
@@ -788,227 +3215,28 @@ class HallMapperApp(ctk.CTk):
                 return {"vid": c['vid'], "pid": c['pid'], "iface": c['iface']}
         return None
 
-    def read_loop(self):
-        last_stats = time.perf_counter()
-        last_ui = 0
-        pcount = 0
-        if not self.device:
-            return
-        
-        while self.running:
-            try:
-                data = self.device.read(64)
-                
-                if not data:
-                    if not self.fast_mode:
-                        time.sleep(0.00005)
-                    continue
-                
-                pcount += 1
-                
-                if len(data) < 7 or data[0] != 0xA0:
-                    continue
-                
-                key = data[3]
-                raw = (data[4] << 8) | data[5]
-                
-                self.processor.process(key, raw)
-                
-                if raw > self.processor.deadzone:
-                    self.active_keys[key] = raw
-                elif key in self.active_keys:
-                    del self.active_keys[key]
-                    self.processor.clear(key)
-                
-                self.update_gamepad()
-                
-                now = time.perf_counter()
-
-                if not self.fast_mode:
-                    if now - last_ui > 0.016:
-                        last_ui = now
-                        self.after(0, self.update_ui)
-
-                    if now - last_stats > 1.0:
-                        pps = pcount
-                        pcount = 0
-                        last_stats = now
-                        self.after(0, lambda p=pps: self.lbl_stats.configure(
-                            text=f" {p} pkt/s | {len(self.active_keys)} keys"
-                        ))
-                
-            except Exception as e:
-                if self.running:
-                    print(f"Read error: {e}")
-                    time.sleep(0.1)
-
-    def update_gamepad(self):
-        if not self.gamepad:
-            return
-
-        lx_raw, ly_raw = 0.0, 0.0
-        rx_raw, ry_raw = 0.0, 0.0
-        lt_raw, rt_raw = 0.0, 0.0
-
-        for key in list(self.active_keys.keys()):
-            ks = str(key)
-            if ks not in self.mappings:
-                continue
-
-            action = self.mappings[ks]
-            val = self.processor.get_state(key).filtered
-
-            if "Right Trigger" in action:
-                rt_raw = max(rt_raw, val)
-            elif "Left Trigger" in action:
-                lt_raw = max(lt_raw, val)
-            elif "Left Stick" in action and "UP" in action:
-                ly_raw = max(ly_raw, val)
-            elif "Left Stick" in action and "DOWN" in action:
-                ly_raw = min(ly_raw, -val)
-            elif "Left Stick" in action and "RIGHT" in action:
-                lx_raw = max(lx_raw, val)
-            elif "Left Stick" in action and "LEFT" in action:
-                lx_raw = min(lx_raw, -val)
-            elif "Right Stick" in action and "UP" in action:
-                ry_raw = max(ry_raw, val)
-            elif "Right Stick" in action and "DOWN" in action:
-                ry_raw = min(ry_raw, -val)
-            elif "Right Stick" in action and "RIGHT" in action:
-                rx_raw = max(rx_raw, val)
-            elif "Right Stick" in action and "LEFT" in action:
-                rx_raw = min(rx_raw, -val)
-
-        targets = {
-            "lx": lx_raw,
-            "ly": ly_raw,
-            "rx": rx_raw,
-            "ry": ry_raw,
-            "lt": lt_raw,
-            "rt": rt_raw,
-        }
-
-        if all(abs(targets[k] - self.target_axes[k]) < 1e-4 for k in targets):
-            return
-
-        self.target_axes = targets
-        self.pad_event.set()
-
-    def gamepad_loop(self):
-        while True:
-            self.pad_event.wait(0.005)
-            self.pad_event.clear()
-
-            if not self.gamepad:
-                time.sleep(0.01)
-                continue
-
-            targets = self.target_axes
-            prev = self.prev_axes
-
-            max_delta = max(abs(targets[k] - prev[k]) for k in targets)
-            if max_delta < 1e-4:
-                if not self.running:
-                    time.sleep(0.01)
-                continue
-
-            steps = 1
-            if max_delta > 0.35:
-                steps = 3
-            elif max_delta > 0.2:
-                steps = 2
-
-            for i in range(1, steps + 1):
-                t = i / steps
-                lx = prev["lx"] + (targets["lx"] - prev["lx"]) * t
-                ly = prev["ly"] + (targets["ly"] - prev["ly"]) * t
-                rx = prev["rx"] + (targets["rx"] - prev["rx"]) * t
-                ry = prev["ry"] + (targets["ry"] - prev["ry"]) * t
-                lt = prev["lt"] + (targets["lt"] - prev["lt"]) * t
-                rt = prev["rt"] + (targets["rt"] - prev["rt"]) * t
-
-                try:
-                    self.gamepad.left_trigger(int(lt * 255))
-                    self.gamepad.right_trigger(int(rt * 255))
-                    self.gamepad.left_joystick(int(lx * 32767), int(ly * 32767))
-                    self.gamepad.right_joystick(int(rx * 32767), int(ry * 32767))
-                    self.gamepad.update()
-                except:
-                    pass
-
-            self.prev_axes.update(targets)
-
     def run_stress_test(self):
+        """Run the benchmark suite on the current settings (full table on the console)."""
         self.lbl_benchmark.configure(text="Running")
 
         def worker():
-            fake_proc = SignalProcessor()
-            fake_proc.deadzone = self.processor.deadzone
-            fake_proc.max_pressure = self.processor.max_pressure
-            fake_proc.sensitivity = self.processor.sensitivity
-            fake_proc.curve = self.processor.curve
-
-            fake_active = {}
-            fake_map = {
-                str(NAME_TO_HID.get("W", 0)): "Left Stick: UP (Y+)",
-                str(NAME_TO_HID.get("S", 0)): "Left Stick: DOWN (Y-)",
-                str(NAME_TO_HID.get("A", 0)): "Left Stick: LEFT (X-)",
-                str(NAME_TO_HID.get("D", 0)): "Left Stick: RIGHT (X+)",
-                str(NAME_TO_HID.get("Q", 0)): "Left Trigger (LT) - Brake",
-                str(NAME_TO_HID.get("E", 0)): "Right Trigger (RT) - Accelerate",
-            }
-
-            keys = list(fake_map.keys())
-            loops = 40000
-            start = time.perf_counter()
-
-            for i in range(loops):
-                k = keys[i % len(keys)]
-                key_int = int(k)
-                raw = (i * 37) % int(fake_proc.max_pressure)
-                fake_proc.process(key_int, raw)
-
-                if raw > fake_proc.deadzone:
-                    fake_active[key_int] = raw
-                elif key_int in fake_active:
-                    del fake_active[key_int]
-
-                action = fake_map.get(k)
-                if not action:
-                    continue
-                val = fake_proc.get_state(key_int).filtered
-                # No-op: we only benchmark processing speed here
-                pass
-
-            elapsed = time.perf_counter() - start
-            rate = loops / elapsed if elapsed else 0
-            msg = f"{rate:,.0f} iter/s | {elapsed*1000/loops:.3f} ms/iter"
+            results = run_benchmarks(dict(self.engine.settings), repeat=1, n=20000)
+            print_benchmarks(results)
+            lines = [
+                f"{name.split('/')[0]}: {r['ns_per_op'] / 1000:.2f} us/pkt"
+                for name, r in results.items() if name.endswith("/pipeline")
+            ]
+            msg = "\n".join(lines)
             self.after(0, lambda: self.lbl_benchmark.configure(text=msg))
 
         threading.Thread(target=worker, daemon=True).start()
 
-    def update_ui(self):
-        self.refresh_visuals()
-        
-        rt_v, lt_v, lx_v = 0.0, 0.0, 0.0
-        
-        for key in self.active_keys:
-            ks = str(key)
-            if ks not in self.mappings:
-                continue
-            
-            val = self.processor.get_state(key).filtered
-            action = self.mappings[ks]
-            
-            if "Right Trigger" in action:
-                rt_v = max(rt_v, val)
-            elif "Left Trigger" in action:
-                lt_v = max(lt_v, val)
-            elif "Left Stick" in action and "RIGHT" in action:
-                lx_v = max(lx_v, val)
-            elif "Left Stick" in action and "LEFT" in action:
-                lx_v = min(lx_v, -val)
+    def update_ui(self, snap: UiSnapshot):
+        self.refresh_visuals(snap=snap)
         
+        axes = snap.axes
+        rt_v, lt_v, lx_v = axes[AXIS_RT], axes[AXIS_LT], axes[AXIS_LX]
+
         try:
             self.bars['rt']['bar'].set(rt_v)
             self.bars['rt']['label'].configure(text=f"{int(rt_v*100)}%")
@@ -1019,263 +3247,971 @@ class HallMapperApp(ctk.CTk):
         except:
             pass
         
-        if self.active_keys:
-            key = list(self.active_keys.keys())[0]
-            state = self.processor.get_state(key)
-            pct = int(state.filtered * 100)
-            lt_dbg = int(self.prev_axes.get("lt", 0.0) * 255)
-            rt_dbg = int(self.prev_axes.get("rt", 0.0) * 255)
+        if snap.keys:
+            raw, filtered = snap.keys[min(snap.keys)]
+            pct = int(filtered * 100)
+            lt_dbg = int(axes[AXIS_LT] * 255)
+            rt_dbg = int(axes[AXIS_RT] * 255)
             self.lbl_debug.configure(
-                text=f"raw={state.raw}  {pct}% | LT/RT={lt_dbg}/{rt_dbg}"
+                text=f"raw={raw}  {pct}% | LT/RT={lt_dbg}/{rt_dbg}"
             )
 
 
+def run_gui():
+    load_gui()
+    app = type("HallMapperApp", (HallMapperApp, ctk.CTk), {})()
+    app.mainloop()
+
+
 class HallMapperHeadless:
     def __init__(self):
-        self.running = False
-        self.device = None
-        self.gamepad = None
-        self.mappings = {}
-        self.active_keys = {}
-        self.processor = SignalProcessor()
-        self.device_info = None
-        self.settings = {
-            "deadzone": 0,
-            "sensitivity": 1.0,
-            "max_pressure": 1600,
-            "curve": "linear"
-        }
-        self.load_config()
-        self.sync_processor()
+        # Headless emits straight from the reader unless --output interpolated
+        self.engine = MappingEngine(output_mode_from_cli("direct"))
+        self.engine.spin_sleep = 0.0001
+        self.engine.stats_interval = 2.0
+        self.engine.on_stats = self.print_stats
+        self.engine.on_finished = self.print_finished
+        if self.engine.load_config():
+            print(f" Config loaded: {len(self.engine.mappings)} mappings")
+        self.engine.sync_processor()
+        self.engine.watch_config()
         
         try:
-            self.gamepad = vg.VX360Gamepad()
-            print(" ViGEm gamepad ready")
+            self.engine.open_pads(sink_from_cli)
+            for pad in self.engine.pads:
+                print(f" {pad.describe()} ready")
         except Exception as e:
-            print(f" ViGEm error: {e}")
+            print(f" ViGEm error: {e} (use --sink null to run without a virtual pad)")
             sys.exit(1)
 
-    def sync_processor(self):
-        self.processor.deadzone = self.settings["deadzone"]
-        self.processor.sensitivity = self.settings["sensitivity"]
-        self.processor.max_pressure = self.settings["max_pressure"]
-        self.processor.curve = self.settings.get("curve", "linear")
-
-    def load_config(self):
-        try:
-            cfg_path = CONFIG_FILE if os.path.exists(CONFIG_FILE) else LEGACY_CONFIG_FILE
-            if os.path.exists(cfg_path):
-                with open(cfg_path, "r") as f:
-                    d = json.load(f)
-                    self.mappings = translate_actions(d.get("mappings", d.get("Mappings", {})))
-                    s = d.get("settings", d.get("Settings", {}))
-                    self.settings["deadzone"] = s.get("deadzone", s.get("Deadzone", 30))
-                    self.settings["sensitivity"] = s.get("sensitivity", s.get("Sensitivity", 1.0))
-                    self.settings["max_pressure"] = s.get("max_pressure", s.get("MaxPressure", 600))
-                    self.settings["curve"] = s.get("curve", s.get("Curve", "linear"))
-                    di = d.get("device_info")
-                    if di:
-                        self.device_info = {
-                            "vid": di.get("vid"),
-                            "pid": di.get("pid"),
-                            "iface": di.get("iface"),
-                        }
-                print(f" Config loaded: {len(self.mappings)} mappings")
-        except Exception as e:
-            print(f" Config error: {e}")
-
-    def save_config(self):
+    def connect(self) -> list:
+        """Sources to read, primary first; empty if no keyboard was found."""
+        engine = self.engine
         try:
-            di = None
-            if self.device_info:
-                di = {
-                    "vid": int(self.device_info.get("vid") or 0),
-                    "pid": int(self.device_info.get("pid") or 0),
-                    "iface": self.device_info.get("iface"),
-                }
-            with open(CONFIG_FILE, "w") as f:
-                json.dump({
-                    "mappings": self.mappings,
-                    "settings": self.settings,
-                    "device_info": di,
-                }, f, indent=2)
-        except Exception as e:
-            print(f" Config save error: {e}")
+            sources = sources_from_cli()
+            if sources:
+                for source in sources:
+                    print(f" {source.describe()}")
+                return sources
 
-    def connect(self):
-        try:
             path = None
 
-            if self.device_info:
-                path = self._match_saved_device(self.device_info)
+            if engine.device_info:
+                path = engine.match_saved_device(engine.device_info)
 
             if not path:
-                # score devices by presence of analog header 0xA0
-                scored = []
-                for d in hid.enumerate():
-                    item = {
-                        'vid': d.get('vendor_id'),
-                        'pid': d.get('product_id'),
-                        'iface': d.get('interface_number', -1),
-                        'path': d.get('path'),
-                    }
-                    score = 0
-                    try:
-                        dev = hid.device()
-                        dev.open_path(item['path'])
-                        dev.set_nonblocking(True)
-                        data = dev.read(64)
-                        dev.close()
-                        if data and len(data) > 0 and data[0] == 0xA0:
-                            score += 10
-                    except:
-                        pass
-                    scored.append((score, item))
-
-                scored.sort(key=lambda x: (-x[0], x[1]['vid'], x[1]['pid'], x[1]['iface']))
+                # Unattended: take the best-scored device even without the analog header
+                scored = engine.scan_devices()
                 if scored:
-                    path = scored[0][1]['path']
-                    self.device_info = {
-                        'vid': scored[0][1]['vid'],
-                        'pid': scored[0][1]['pid'],
-                        'iface': scored[0][1]['iface'],
+                    top = scored[0][1]
+                    path = top['path']
+                    engine.device_info = {
+                        'vid': top['vid'],
+                        'pid': top['pid'],
+                        'iface': top['iface'],
                     }
-                    self.save_config()
+                    engine.save_config()
 
             if not path:
                 print(" Hall-effect keyboard not detected")
-                return False
+                return []
             
-            self.device = hid.device()
-            self.device.open_path(path)
-            self.device.set_nonblocking(True)
+            sources = [HidSource(path)]
             print(" Keyboard connected")
-            return True
+            extra = engine.open_extra_devices()
+            if extra:
+                print(f" {len(extra)} extra device(s) connected")
+            return sources + extra
             
         except Exception as e:
             print(f" Connection error: {e}")
-            return False
+            return []
 
-    def _match_saved_device(self, info):
-        for d in hid.enumerate(info.get('vid'), info.get('pid')):
-            iface = d.get('interface_number', -1)
-            if iface == info.get('iface') or info.get('iface') is None:
-                return d['path']
-        return None
+    def print_stats(self, pps: float):
+        engine = self.engine
+        keys_str = ", ".join([HID_MAP.get(k, f"0x{k:02X}") for k in engine.processor.store.active_codes()])
+        batch_str = f" | {format_batch_stats(engine.batcher.take_stats())}" if engine.batch_mode else ""
+        if isinstance(engine.device, SyntheticSource):
+            batch_str += f" | backlog {engine.device.backlog()}"
+        if engine.pads:
+            batch_str += " | " + " | ".join(engine.output_summary())
+        if engine.metrics:
+            batch_str += f" | {engine.metrics.short()}"
+        if len(engine.slots) > 1:
+            batch_str += " | " + ", ".join(f"#{s.index} {s.pps:.0f} pkt/s" for s in engine.slots)
+        print(f"\r {pps:.0f} pkt/s | Active: {keys_str or 'none'}{batch_str}      ", end="", flush=True)
 
-    def update_gamepad(self):
-        if not self.gamepad:
-            return
-        
-        lx, ly, rx, ry = 0.0, 0.0, 0.0, 0.0
-        lt, rt = 0.0, 0.0
-        
-        for key in list(self.active_keys.keys()):
-            ks = str(key)
-            if ks not in self.mappings:
-                continue
-            
-            action = self.mappings[ks]
-            val = self.processor.get_state(key).filtered
-            
-            if "Right Trigger" in action:
-                rt = max(rt, val)
-            elif "Left Trigger" in action:
-                lt = max(lt, val)
-            elif "Left Stick" in action and "UP" in action:
-                ly = max(ly, val)
-            elif "Left Stick" in action and "DOWN" in action:
-                ly = min(ly, -val)
-            elif "Left Stick" in action and "RIGHT" in action:
-                lx = max(lx, val)
-            elif "Left Stick" in action and "LEFT" in action:
-                lx = min(lx, -val)
-            elif "Right Stick" in action and "UP" in action:
-                ry = max(ry, val)
-            elif "Right Stick" in action and "DOWN" in action:
-                ry = min(ry, -val)
-            elif "Right Stick" in action and "RIGHT" in action:
-                rx = max(rx, val)
-            elif "Right Stick" in action and "LEFT" in action:
-                rx = min(rx, -val)
-        
-        try:
-            self.gamepad.left_trigger(int(lt * 255))
-            self.gamepad.right_trigger(int(rt * 255))
-            self.gamepad.left_joystick(int(lx * 32767), int(ly * 32767))
-            self.gamepad.right_joystick(int(rx * 32767), int(ry * 32767))
-            self.gamepad.update()
-        except:
-            pass
+    def print_finished(self):
+        total = self.engine.total_reports
+        elapsed = time.perf_counter() - self.engine.started_at
+        print(f"\n Source finished: {total} reports in {elapsed:.3f}s ({total / elapsed if elapsed else 0:,.0f} pkt/s)")
 
     def run(self):
-        if not self.connect():
+        sources = self.connect()
+        if not sources:
             return
         
-        self.running = True
+        engine = self.engine
         print("\n" + "="*50)
         print("  Hall Analog Mapper - Headless mode (no UI)")
+        print(f"  Output: {engine.output_mode}" + (f" @ {engine.output_rate} Hz" if engine.output_rate else "")
+              + f", {len(engine.pads)} pad(s)")
         print("  Press Ctrl+C to exit")
         print("="*50 + "\n")
         
-        last_stats = time.perf_counter()
-        pcount = 0
-        
         try:
-            while self.running:
-                if not self.device:
-                    break
-                data = self.device.read(64)
-                
-                if not data:
-                    time.sleep(0.0001)
-                    continue
-                
-                pcount += 1
-                
-                if len(data) < 7 or data[0] != 0xA0:
-                    continue
-                
-                key = data[3]
-                raw = (data[4] << 8) | data[5]
-                
-                self.processor.process(key, raw)
-                
-                if raw > self.processor.deadzone:
-                    self.active_keys[key] = raw
-                elif key in self.active_keys:
-                    del self.active_keys[key]
-                    self.processor.clear(key)
-                
-                self.update_gamepad()
-                
-                now = time.perf_counter()
-                if now - last_stats > 2.0:
-                    pps = pcount / 2
-                    pcount = 0
-                    last_stats = now
-                    keys_str = ", ".join([HID_MAP.get(k, f"0x{k:02X}") for k in self.active_keys.keys()])
-                    print(f"\r {pps:.0f} pkt/s | Active: {keys_str or 'none'}      ", end="", flush=True)
-                    
+            engine.start(sources, threaded=False)
+            engine.report_ready()
+            engine.read_loop()
         except KeyboardInterrupt:
             print("\n\n Stopped by user")
         finally:
-            self.running = False
-            if self.device:
-                self.device.close()
-            if self.gamepad:
-                self.gamepad.left_trigger(0)
-                self.gamepad.right_trigger(0)
-                self.gamepad.left_joystick(0, 0)
-                self.gamepad.right_joystick(0, 0)
-                self.gamepad.update()
+            engine.stop()
+            if engine.output_rate:
+                time.sleep(2 / engine.output_rate)  # let the last tick center the pads
+                for pad in engine.pads:
+                    print(f" {pad.describe()} ticks: {pad.scheduler.short()}")
+                    print(f"  {pad.axis_buffer.seq // 2} target changes coalesced into {pad.scheduler.emitted} updates")
+            if engine.metrics:
+                print("\n Latency (HID read -> gamepad.update):")
+                for line in engine.metrics.lines():
+                    print("  " + line)
+                json_path = cli_value("--latency-json", "")
+                if json_path:
+                    print(f" Latency histograms written to {json_path}")
+            if len(engine.slots) > 1:
+                print("\n Devices:")
+                for slot in engine.slots:
+                    line = f"  {slot.describe()}: {slot.reports} reports"
+                    if slot.metrics:
+                        line += f" | {slot.metrics.short()}"
+                    print(line)
+            for pad in engine.pads:
+                pad.gamepad.close()
+                print(f" {pad.describe()}: {pad.gamepad.updates} gamepad updates sent, "
+                      f"{pad.gamepad.suppressed} suppressed (unchanged after quantization)")
+                if pad.gamepad.first_ns:
+                    print(f"  first output {(pad.gamepad.first_ns - LAUNCH_NS) / 1e6:.0f} ms after launch")
             print(" Cleanup done")
 
 
+# ============================================================================
+# BENCHMARKS
+# ============================================================================
+
+class LoopbackSource(InputSource):
+    """
+    Source fed from another thread: read(64, timeout_ms) waits on a condition
+    like hid_read_timeout. The push timestamp of every report handed out is
+    appended to 'stamps'.
+    """
+
+    def __init__(self):
+        self.stamps = []
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+
+    def push(self, report):
+        with self._cond:
+            self._queue.append((time.perf_counter_ns(), report))
+            self._cond.notify()
+
+    def read(self, max_length: int, timeout_ms: int = 0):
+        with self._cond:
+            if not self._queue and timeout_ms > 0:
+                self._cond.wait(timeout_ms / 1000)
+            if not self._queue:
+                return []
+            stamp, report = self._queue.popleft()
+        self.stamps.append(stamp)
+        return report
+
+
+def _percentile(sorted_vals, q: float):
+    if not sorted_vals:
+        return 0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def bench_reader_modes(rate: int = 1000, seconds: float = 2.0, idle: float = 1.0):
+    """
+    Compare reader modes on a loopback device: reader-thread CPU seconds per
+    wall second (under load and idle) and wake-to-process latency.
+    """
+    modes = [("spin", "spin", 0.00005), ("spin --fast", "spin", 0.0), ("block", "block", 0.0)]
+    print(f"Reader benchmark: {rate} pkt/s for {seconds:.1f}s, then {idle:.1f}s idle")
+    print(f"{'mode':<12} {'cpu/s load':>10} {'cpu/s idle':>10} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+
+    for label, mode, spin_sleep in modes:
+        dev = LoopbackSource()
+        processor = SignalProcessor()
+        processor.configure(0, 1.0, 1600, "linear")
+        aggregator = AxisAggregator(compile_mappings({str(NAME_TO_HID["W"]): "Left Stick: UP (Y+)"}))
+        batcher = ReportBatcher(1)
+        latencies = []
+        cpu = {}
+        state = {"running": True, "phase": "load"}
+
+        def reader():
+            phase_start = time.thread_time()
+            phase = state["phase"]
+            while state["running"]:
+                if state["phase"] != phase:
+                    cpu[phase] = time.thread_time() - phase_start
+                    phase_start = time.thread_time()
+                    phase = state["phase"]
+                if read_batch(batcher, dev, mode, spin_sleep):
+                    batcher.apply(processor, aggregator)
+                    now = time.perf_counter_ns()
+                    for stamp in dev.stamps:
+                        latencies.append(now - stamp)
+                    dev.stamps.clear()
+            cpu[phase] = time.thread_time() - phase_start
+
+        t = threading.Thread(target=reader, daemon=True)
+        t.start()
+
+        key = NAME_TO_HID["W"]
+        interval = 1.0 / rate
+        start = time.perf_counter()
+        next_at = start
+        i = 0
+        while time.perf_counter() - start < seconds:
+            raw = (i * 37) % 1600
+            dev.push([REPORT_HEADER, 0, 0, key, raw >> 8, raw & 0xFF, 0])
+            i += 1
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        state["phase"] = "idle"
+        time.sleep(idle)
+        state["running"] = False
+        t.join()
+
+        latencies.sort()
+        print(
+            f"{label:<12} {cpu.get('load', 0) / seconds:>10.3f} {cpu.get('idle', 0) / idle:>10.3f} "
+            f"{_percentile(latencies, 0.5) / 1000:>8.1f} {_percentile(latencies, 0.99) / 1000:>8.1f} "
+            f"{(latencies[-1] if latencies else 0) / 1000:>8.1f}"
+        )
+
+
+class ListSource(InputSource):
+    """Finite in-memory source: hands out a prepared list of reports, then finishes."""
+
+    def __init__(self, reports):
+        self.reports = reports
+        self._next = iter(reports).__next__
+
+    def read(self, max_length: int, timeout_ms: int = 0):
+        try:
+            return self._next()
+        except StopIteration:
+            self.finished = True
+            return []
+
+
+BENCH_CURVES = ("linear", "exponential", "scurve", "fast", "aggressive")
+BENCH_THRESHOLD = 0.15  # ns/op slowdown flagged as a regression
+
+
+def bench_mappings(codes) -> Dict[str, str]:
+    """Map codes round-robin over the ten axis actions."""
+    axis_actions = [a for a in CONTROLLER_ACTIONS if action_to_axis(a)]
+    return {str(code): axis_actions[i % len(axis_actions)] for i, code in enumerate(codes)}
+
+
+def _report(key: int, raw: int) -> bytes:
+    return bytes((REPORT_HEADER, 0, 0, key, raw >> 8, raw & 0xFF, 0)) + bytes(57)
+
+
+def bench_scenarios(n: int = 40000) -> dict:
+    """name -> (mappings, reports, max_batch)."""
+    w, a, s_, d = (NAME_TO_HID[k] for k in "WASD")
+    ramp = [_report(w, 1600 * (i % 200 if i % 400 < 200 else 200 - i % 200) // 200) for i in range(n)]
+
+    chords = []
+    for i in range(n):
+        key = (w, a, s_, d)[i % 4]
+        phase = (i // 4 + (i % 4) * 50) % 400
+        chords.append(_report(key, 0 if phase >= 200 else 1600 * phase // 200))
+
+    held = [_report(SYNTHETIC_KEYS[i % 32], 200 + (i * 37) % 1400) for i in range(n)]
+
+    # 8000 reports already queued (not paced): drained MAX_BATCH per wakeup
+    backlog = [_report(SYNTHETIC_KEYS[i % 8], (i * 53) % 1600) for i in range(8000)]
+
+    return {
+        "single_key_ramp": ({str(w): "Left Stick: UP (Y+)"}, ramp, 1),
+        "wasd_chords": (bench_mappings((w, s_, a, d)), chords, 1),
+        "held_32_keys": (bench_mappings(SYNTHETIC_KEYS[:32]), held, 1),
+        "backlog_8000": (bench_mappings(SYNTHETIC_KEYS[:8]), backlog, MAX_BATCH),
+        "curve_switching": (bench_mappings((w, s_, a, d)), chords, 1),
+    }
+
+
+def _best_ns(fn, ops: int, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / ops if ops else 0.0
+
+
+def run_benchmarks(settings: dict = None, repeat: int = 5, n: int = 40000) -> dict:
+    """
+    Headless benchmark of every pipeline stage (no Tk window, NullSink output).
+    Returns {"scenario/stage": {"ns_per_op", "ops_per_s", "ops"}}.
+    """
+    settings = settings or {"deadzone": 30, "sensitivity": 1.0, "max_pressure": 1600, "curve": "linear"}
+    args = (settings["deadzone"], settings["sensitivity"], settings["max_pressure"], settings.get("curve", "linear"))
+    results = {}
+
+    def put(name, ns, ops):
+        results[name] = {"ns_per_op": round(ns, 1), "ops_per_s": round(1e9 / ns) if ns else 0, "ops": ops}
+
+    for scenario, (mappings, reports, max_batch) in bench_scenarios(n).items():
+        pairs = [(r[3], (r[4] << 8) | r[5]) for r in reports]
+        table = compile_mappings(mappings)
+        processor = SignalProcessor()
+        processor.configure(*args)
+        vals = [(k, processor.process(k, raw)) for k, raw in pairs]
+        processor.reset()
+
+        def parse():
+            batcher = ReportBatcher(max_batch)
+            src = ListSource(reports)
+            while batcher.drain(src.read):
+                batcher.discard()
+
+        def process():
+            proc = processor.process
+            for k, raw in pairs:
+                proc(k, raw)
+
+        def aggregate():
+            update = AxisAggregator(table).update
+            for k, v in vals:
+                update(k, v)
+
+        def pipeline():
+            # Headless path: drain, process, aggregate, emit on change
+            batcher = ReportBatcher(max_batch)
+            src = ListSource(reports)
+            proc = SignalProcessor()
+            proc.configure(*args)
+            agg = AxisAggregator(table)
+            sink = NullSink()
+            while batcher.drain(src.read):
+                if batcher.apply(proc, agg):
+                    emit_axes(sink, *agg.values)
+
+        put(f"{scenario}/parse", _best_ns(parse, len(reports), repeat), len(reports))
+        put(f"{scenario}/process", _best_ns(process, len(pairs), repeat), len(pairs))
+        put(f"{scenario}/aggregate", _best_ns(aggregate, len(vals), repeat), len(vals))
+        put(f"{scenario}/pipeline", _best_ns(pipeline, len(reports), repeat), len(reports))
+
+        if scenario == "wasd_chords":
+            # GUI output thread: micro-interpolated emits per published target change
+            agg = AxisAggregator(table)
+            targets = []
+            for k, v in vals:
+                if agg.update(k, v) >= 0:
+                    targets.append(array('d', agg.values))
+
+            def interpolate():
+                sink = NullSink()
+                prev = array('d', ZERO_AXES)
+                for t in targets:
+                    emit_interpolated(sink, prev, t)
+                    prev[:] = t
+
+            put(f"{scenario}/interpolate", _best_ns(interpolate, len(targets), repeat), len(targets))
+
+        if scenario == "curve_switching":
+            def switch():
+                proc = SignalProcessor()
+                for i, (k, raw) in enumerate(pairs):
+                    if i % 1000 == 0:
+                        curve = BENCH_CURVES[(i // 1000) % len(BENCH_CURVES)]
+                        proc.configure(args[0], args[1], args[2], curve)
+                    proc.process(k, raw)
+
+            def reconfigure():
+                proc = SignalProcessor()
+                for i in range(50):
+                    proc.configure(args[0], args[1], args[2], BENCH_CURVES[i % len(BENCH_CURVES)])
+
+            def compile_config():
+                for _ in range(200):
+                    compile_mappings(bench_mappings(SYNTHETIC_KEYS))
+
+            put(f"{scenario}/process_switching", _best_ns(switch, len(pairs), repeat), len(pairs))
+            put(f"{scenario}/configure", _best_ns(reconfigure, 50, repeat), 50)
+            put("config/compile_mappings", _best_ns(compile_config, 200, repeat), 200)
+
+    return results
+
+
+def print_benchmarks(results: dict, baseline: dict = None, threshold: float = BENCH_THRESHOLD) -> list:
+    """Print the results table; returns the names of regressed entries."""
+    regressions = []
+    print(f"{'scenario/stage':<36} {'ns/op':>10} {'ops/s':>12} {'vs base':>9}")
+    for name, r in results.items():
+        cmp = ""
+        old = (baseline or {}).get(name)
+        if old and old.get("ns_per_op"):
+            ratio = r["ns_per_op"] / old["ns_per_op"]
+            cmp = f"{(ratio - 1) * 100:+.0f}%"
+            if ratio > 1 + threshold:
+                cmp += " !"
+                regressions.append(name)
+        print(f"{name:<36} {r['ns_per_op']:>10.1f} {r['ops_per_s']:>12,} {cmp:>9}")
+    return regressions
+
+
+def bench_main() -> int:
+    """--bench [--bench-save FILE] [--bench-compare FILE]; exit code 1 on regressions."""
+    import platform
+
+    baseline = None
+    compare = cli_value("--bench-compare", "")
+    if compare:
+        with open(compare, "r") as f:
+            baseline = json.load(f).get("results", {})
+
+    print(f"Hall Analog Mapper benchmark - Python {platform.python_version()} ({platform.system()})")
+    results = run_benchmarks()
+    regressions = print_benchmarks(results, baseline)
+
+    save = cli_value("--bench-save", "")
+    if save:
+        with open(save, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"Baseline saved to {save}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {BENCH_THRESHOLD:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def bench_sinks(calls: int = 100000):
+    """ns per emitted state (4 axis calls + update) for each available sink."""
+    import tempfile
+
+    print(f"Sink benchmark: {calls} emits")
+    with tempfile.TemporaryDirectory() as tmp:
+        factories = [
+            ("null", NullSink),
+            ("record", lambda: RecordingSink(os.path.join(tmp, "out.bin"))),
+            ("vigem", ViGEmSink),
+        ]
+        for label, factory in factories:
+            try:
+                sink = factory()
+            except Exception as e:
+                print(f"{label:<8} unavailable ({e})")
+                continue
+            start = time.perf_counter_ns()
+            for i in range(calls):
+                v = i & 0xFF
+                sink.left_trigger(v)
+                sink.right_trigger(255 - v)
+                sink.left_joystick(v * 128, -v * 128)
+                sink.right_joystick(0, 0)
+                sink.update()
+            elapsed = time.perf_counter_ns() - start
+
+            # Diffed path: one slowly moving trigger, most steps below one 0..255 quantum
+            sink.reset()
+            sent, suppressed = sink.updates, sink.suppressed
+            start = time.perf_counter_ns()
+            for i in range(calls):
+                emit_axes(sink, 0.0, 0.0, 0.0, 0.0, (i % 1000) / 1000, 0.0)
+            diffed = time.perf_counter_ns() - start
+            sent, suppressed = sink.updates - sent, sink.suppressed - suppressed
+            sink.reset()
+            sink.close()
+            print(f"{label:<8} {elapsed / calls:>10.0f} ns/emit | emit_axes {diffed / calls:>6.0f} ns/call, "
+                  f"{sent} updates, {suppressed} suppressed")
+
+
+def bench_handoff(packets: int = 200000, seconds: float = 1.0) -> int:
+    """
+    Self-check of the reader -> pad thread AxisBuffer handoff (--bench-handoff).
+    1) Steady state, one thread: memory traced by tracemalloc over a short and a
+       10x longer run of the full engine packet path must be identical (nothing
+       scales with packets). Per packet: ReportBatcher drain/apply,
+       AxisAggregator.update, update_gamepad's publish, then the pad thread's
+       read_into and emit_interpolated on a NullSink, run inline. Its transient
+       high-water mark may exceed that of the bare loop (drain, discard and the
+       pad event, i.e. interpreter temporaries) by less than a single axis
+       dict (no per-packet containers).
+    2) Two threads: the writer publishes six equal axes, the reader must never
+       see a mixed (torn) set.
+    Returns 0 if both pass, 1 otherwise.
+    """
+    import tracemalloc
+
+    codes = SYNTHETIC_KEYS[:4]
+    reports = [_report(codes[i % 4], (i * 37) % 1600) for i in range(4096)]
+    engine = MappingEngine("interpolated")
+    engine.metrics = None
+    engine.mappings = bench_mappings(codes)
+    engine.open_pads(lambda index: NullSink())
+    engine.sync_processor()  # as start() does: settings cover the stream (no saturated tail)
+    slot = DeviceSlot(0, None, engine.processor)
+    batcher = ReportBatcher(1)
+    pad = engine.pads[0]
+    buf, prev = pad.axis_buffer, pad.prev_axes
+    axes = array('d', ZERO_AXES)
+    stamps = array('q', bytes(8 * AxisBuffer.STAMPS))
+    next_report = itertools.cycle(reports).__next__
+
+    def read(size, timeout_ms=0):
+        return next_report()
+
+    def run(n):
+        for _ in range(n):
+            batcher.drain(read)
+            changed = batcher.apply(engine.processor, engine.aggregator)
+            if changed:
+                engine.update_gamepad(1, 2, slot, changed)
+            buf.read_into(axes, stamps)
+            emit_interpolated(pad.gamepad, prev, axes)
+            prev[:] = axes
+
+    def bare(n):
+        for _ in range(n):
+            batcher.drain(read)
+            batcher.discard()
+            pad.event.set()
+            pad.event.clear()
+
+    def traced(loop, n):
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        loop(n)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return current - base, peak - base
+
+    run(packets)  # warm up
+    bare(packets)
+    short = traced(run, packets // 10)
+    retained, transient = traced(run, packets)
+    floor = traced(bare, packets)[1]
+    limit = floor + sys.getsizeof(dict.fromkeys(AXIS_NAMES, 0.0))
+    alloc_ok = (retained, transient) == short and transient < limit
+    print(f"engine packet allocations: {retained} B retained, {transient} B transient peak over "
+          f"{packets} packets ({short[0]} / {short[1]} B over {packets // 10}; "
+          f"limit {limit} B = bare loop {floor} B + one axis dict) ({'ok' if alloc_ok else 'FAIL'})")
+
+    buf = AxisBuffer()
+    done = threading.Event()
+    counts = {"reads": 0, "torn": 0, "writes": 0}
+
+    def writer():
+        i = 0
+        while not done.is_set():
+            i += 1
+            v = (i % 1000) / 1000
+            buf.publish((v, v, v, v, v, v), i, i)
+        counts["writes"] = i
+
+    def reader():
+        seen = array('d', ZERO_AXES)
+        st = array('q', bytes(8 * AxisBuffer.STAMPS))
+        while not done.is_set():
+            buf.read_into(seen, st)
+            counts["reads"] += 1
+            if min(seen) != max(seen) or st[0] != st[1]:
+                counts["torn"] += 1
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    done.set()
+    for t in threads:
+        t.join()
+    torn_ok = counts["torn"] == 0
+    print(f"handoff consistency: {counts['reads']} reads / {counts['writes']} writes, "
+          f"{counts['torn']} torn ({'ok' if torn_ok else 'FAIL'})")
+    return 0 if alloc_ok and torn_ok else 1
+
+
+def filter_trace(kind: str, cutoff: float, beta: float, rate: int = 1000) -> dict:
+    """
+    One key at `rate` reports/s: 20 ms idle, a 40 ms press ramp to 60%, then
+    300 ms held with +/-2% sensor noise. Compares the filter against the raw
+    (unfiltered) output: ms of lag at 50%/90% of the ramp and peak-to-peak
+    jitter (% of full scale) over the last 200 ms of the hold.
+    Then the same ramp held with no further reports (a keyboard only reports
+    changes), stepped every FILTER_STEP_MS like the reader does: ms until the
+    output is within 0.5% of the target, and the output after 300 ms.
+    """
+    import random
+
+    rng = random.Random(1)
+    dt_ns = 1_000_000_000 // rate
+    level = 600
+    raws = [0] * (rate * 20 // 1000)
+    ramp = rate * 40 // 1000
+    raws += [level * (i + 1) // ramp for i in range(ramp)]
+    raws += [level + rng.randint(-20, 20) for _ in range(rate * 300 // 1000)]
+
+    proc = SignalProcessor()
+    proc.configure(0, 1.0, 1000, "linear")
+    proc.configure_filter(kind, cutoff, beta)
+    key = SYNTHETIC_KEYS[0]
+    out = [proc.process(key, raw, (i + 1) * dt_ns) for i, raw in enumerate(raws)]
+    ref = [raw / 1000 for raw in raws]
+
+    def first(vals, threshold):
+        return next(i for i, v in enumerate(vals) if v >= threshold)
+
+    target = level / 1000
+    tail = out[-(rate * 200 // 1000):]
+    ms = 1000 / rate
+
+    proc.reset()
+    ramp_end = rate * 60 // 1000
+    for i, raw in enumerate(raws[:ramp_end]):
+        value = proc.process(key, raw, (i + 1) * dt_ns)
+    settle_ms = None
+    step_ns = FILTER_STEP_MS * 1_000_000
+    for step in range(1, 300 // FILTER_STEP_MS + 1):
+        if settle_ms is None and abs(value - target) <= 0.005:
+            settle_ms = (step - 1) * FILTER_STEP_MS
+        for k in proc.settle():
+            value = proc.process(k, raws[ramp_end - 1], ramp_end * dt_ns + step * step_ns)
+    return {
+        "lag50_ms": (first(out, target * 0.5) - first(ref, target * 0.5)) * ms,
+        "lag90_ms": (first(out, target * 0.9) - first(ref, target * 0.9)) * ms,
+        "jitter_pct": (max(tail) - min(tail)) * 100,
+        "hold_ms": settle_ms,
+        "hold_value": value,
+        "pairs": [(raw, (i + 1) * dt_ns) for i, raw in enumerate(raws)],
+    }
+
+
+def bench_filters(settings: dict = None, repeat: int = 5):
+    """
+    --bench-filters: lag, hold jitter, settling of a held key with no further
+    reports and cost of each smoothing filter preset (and the configured
+    one), next to no filter at all.
+    """
+    presets = [
+        ("none", 0.0, 0.0),
+        ("ema", 5.0, 0.0),
+        ("ema", 15.0, 0.0),
+        ("ema", 30.0, 0.0),
+        ("oneeuro", 1.0, 0.5),
+        ("oneeuro", 1.0, 2.0),
+        ("oneeuro", 5.0, 1.0),
+    ]
+    if settings and settings.get("filter", "none") != "none":
+        presets.append((settings["filter"], settings.get("filter_cutoff", 5.0), settings.get("filter_beta", 1.0)))
+
+    print(f"{'filter':<9} {'cutoff':>7} {'beta':>6} {'lag50 ms':>9} {'lag90 ms':>9} "
+          f"{'jitter %':>9} {'hold ms':>8} {'held at':>8} {'ns/op':>8}")
+    key = SYNTHETIC_KEYS[0]
+    for kind, cutoff, beta in presets:
+        r = filter_trace(kind, cutoff, beta)
+        pairs = r["pairs"]
+        proc = SignalProcessor()
+        proc.configure(0, 1.0, 1000, "linear")
+        proc.configure_filter(kind, cutoff, beta)
+
+        def run():
+            proc.reset()
+            for raw, now in pairs:
+                proc.process(key, raw, now)
+
+        ns = _best_ns(run, len(pairs), repeat)
+        hold = "never" if r["hold_ms"] is None else f"{r['hold_ms']:.0f}"
+        print(f"{kind:<9} {cutoff:>7.1f} {beta:>6.2f} {r['lag50_ms']:>9.1f} {r['lag90_ms']:>9.1f} "
+              f"{r['jitter_pct']:>9.2f} {hold:>8} {r['hold_value']:>8.3f} {ns:>8.0f}")
+
+
+def bench_pads(n: int = 40000, repeat: int = 3, seconds: float = 1.0):
+    """
+    --bench-pads: per-packet cost of the engine path (read, process, aggregate,
+    emit) with 1, 2 and 4 pads on null sinks, then pad isolation in the
+    interpolated and direct modes: latency of a 250 pkt/s stream on pad 2,
+    alone and while another device bursts 8000 pkt/s into pad 1.
+    """
+    codes = SYNTHETIC_KEYS[:8]
+    reports = [_report(codes[i % 8], (i * 53) % 1600) for i in range(n)]
+    print(f"{'pads':>4} {'ns/pkt':>8} {'updates per pad':>24}")
+    for pads in (1, 2, 4):
+        engine = MappingEngine("direct")
+        engine.metrics = None
+        engine.mappings = {
+            code: pad_action(i % pads, action)
+            for i, (code, action) in enumerate(bench_mappings(codes).items())
+        }
+        engine.open_pads(lambda index: NullSink())
+
+        def run():
+            engine.start([ListSource(reports)], threaded=False)
+            engine.read_loop()
+            engine.stop()
+
+        ns = _best_ns(run, n, repeat)
+        updates = " ".join(str(pad.gamepad.updates // repeat) for pad in engine.pads)
+        print(f"{pads:>4} {ns:>8.0f} {updates:>24}")
+
+    def pad2_latency(mode: str, burst: bool) -> str:
+        engine = MappingEngine(mode)
+        engine.metrics = LatencyStats()
+        on_pad2 = {code: pad_action(1, action) for code, action in bench_mappings(codes).items()}
+        engine.mappings = bench_mappings(codes) if burst else on_pad2
+        engine.extra_devices = [{"mappings": on_pad2}]
+        engine.open_pads(lambda index: NullSink())
+        slow = SyntheticSource(rate=250, keys=4, duration=seconds)
+        sources = [SyntheticSource(rate=8000, keys=8, duration=seconds), slow] if burst else [slow]
+        engine.start(sources, threaded=False)
+        engine.read_loop()
+        time.sleep(0.05)
+        metrics = engine.slots[-1].metrics or engine.metrics
+        engine.stop()
+        return metrics.short()
+
+    for mode in ("interpolated", "direct"):
+        print(f"{mode:<12} pad 2 alone:          {pad2_latency(mode, False)}")
+        print(f"{mode:<12} pad 2 + pad 1 burst:  {pad2_latency(mode, True)}")
+
+
+def bench_ui(frames: int = 2000, seconds: float = 1.0, rate: int = 2000):
+    """
+    --bench-ui: per-frame cost of the keyboard renderer (refresh_visuals) with
+    0, 1 and 20 keys held at a pressure that moves every frame, on stand-in
+    buttons that only count configure() calls. Each configure is a CTk
+    redraw, so calls/frame is the number that matters on a real window.
+    Then read->output latency of a synthetic stream with and without a UI
+    thread polling ui_snapshot() and rendering at UI_FPS.
+    """
+    class CountingButton:
+        def __init__(self):
+            self.calls = 0
+
+        def configure(self, **kwargs):
+            self.calls += 1
+
+    codes = list(HID_MAP)
+
+    def renderer(engine):
+        app = HallMapperApp.__new__(HallMapperApp)  # renderer state only, no window
+        app.engine = engine
+        app.selected_key_code = None
+        app._key_styles = {}
+        app._shown_active = bytes(32)
+        app.buttons_ui = {code: CountingButton() for code in codes}
+        app.refresh_visuals(force=True)
+        for btn in app.buttons_ui.values():
+            btn.calls = 0
+        return app
+
+    print(f"{len(codes)} key buttons, {frames} frames")
+    print(f"{'held':>4} {'us/frame':>9} {'configure/frame':>16}")
+    for held in (0, 1, 20):
+        engine = MappingEngine()
+        engine.mappings = bench_mappings(codes[:8])
+        engine.processor.configure(0, 1.0, 1600, "linear")
+        app = renderer(engine)
+
+        process = app.engine.processor.process
+        elapsed = 0
+        for frame in range(frames):
+            for i, code in enumerate(codes[:held]):
+                process(code, 200 + (frame * 7 + i * 13) % 300)
+            start = time.perf_counter_ns()
+            app.refresh_visuals()
+            elapsed += time.perf_counter_ns() - start
+        calls = sum(btn.calls for btn in app.buttons_ui.values())
+        print(f"{held:>4} {elapsed / frames / 1000:>9.1f} {calls / frames:>16.2f}")
+
+    print(f"\nread->output latency at {rate} pkt/s, UI polling at {UI_FPS} fps")
+    print(f"{'ui':<8} {'frames':>6} {'p50 us':>7} {'p99 us':>7} {'max us':>7}")
+    for polling in (False, True):
+        engine = MappingEngine("direct")
+        engine.metrics = LatencyStats()
+        engine.mappings = bench_mappings(SYNTHETIC_KEYS[:8])
+        engine.open_pads(lambda index: NullSink())
+        app = renderer(engine)
+        source = SyntheticSource(rate=rate, keys=8, duration=seconds)
+        engine.start([source])
+        shown = 0
+        while not source.finished:
+            if polling:
+                app.refresh_visuals(snap=engine.ui_snapshot())
+                shown += 1
+            time.sleep(1 / UI_FPS)
+        engine.stop()
+        t = engine.metrics.total.summary()
+        print(f"{'polling' if polling else 'none':<8} {shown:>6} {t['p50_us']:>7.0f} "
+              f"{t['p99_us']:>7.0f} {t['max_us']:>7.0f}")
+
+
+def bench_reload(seconds: float = 1.0, rate: int = 2000, every: float = 0.01):
+    """
+    --bench-reload: direct-mode engine fed by a synthetic stream, first
+    undisturbed, then while the main thread hot-reloads the config every
+    'every' s (alternating curves, so each reload rebuilds the LUT and the
+    mapping table). Prints read->output latency and the longest gap between
+    two pad updates for both runs.
+    """
+    codes = SYNTHETIC_KEYS[:8]
+    configs = [
+        {"mappings": bench_mappings(codes), "settings": {"deadzone": 0, "max_pressure": 1600, "curve": curve}}
+        for curve in ("linear", "exponential")
+    ]
+
+    class GapSink(NullSink):
+        def __init__(self):
+            super().__init__()
+            self.last = 0
+            self.gap = 0
+
+        def update(self):
+            now = time.perf_counter_ns()
+            if self.last and now - self.last > self.gap:
+                self.gap = now - self.last
+            self.last = now
+            self.updates += 1
+
+    print(f"{rate} pkt/s for {seconds:.1f}s, reload every {every * 1000:.0f} ms")
+    print(f"{'run':<10} {'reloads':>7} {'reload ms':>9} {'p99 us':>8} {'max us':>8} {'max gap us':>10}")
+    for reloading in (False, True):
+        engine = MappingEngine("direct")
+        engine.metrics = LatencyStats()
+        engine.apply_config(configs[0])
+        engine.sync_processor()
+        engine.open_pads(lambda index: GapSink())
+        source = SyntheticSource(rate=rate, keys=len(codes), duration=seconds)
+        engine.start([source])
+        took = []
+        while not source.finished:
+            if reloading:
+                took.append(engine.reload_config(configs[len(took) % 2]))
+            time.sleep(every)
+        engine.stop()
+        t = engine.metrics.total.summary()
+        avg = sum(took) / len(took) if took else 0.0
+        print(f"{'reloading' if reloading else 'steady':<10} {len(took):>7} {avg:>9.2f} "
+              f"{t['p99_us']:>8.0f} {t['max_us']:>8.0f} {engine.gamepad.gap / 1000:>10.0f}")
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process in KiB."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                    "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                    "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize // 1024
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def startup_child(mode: str) -> int:
+    """--startup-child: load what the front end needs at startup, print ms/RSS as JSON."""
+    try:
+        if mode == "gui":
+            load_gui()
+    except ImportError as e:
+        print(json.dumps({"error": str(e)}))
+        return 1
+    print(json.dumps({"module_ms": (time.perf_counter_ns() - LAUNCH_NS) / 1e6, "rss_kb": peak_rss_kb()}))
+    return 0
+
+
+def bench_startup(repeat: int = 5):
+    """
+    Fresh interpreter per run: wall time to load the script for each front
+    end (minus a bare interpreter start), time spent after the stdlib imports
+    and peak RSS. Best of 'repeat' runs.
+    """
+    import subprocess
+
+    def best(args):
+        wall, child = [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = subprocess.run([sys.executable] + args, capture_output=True, text=True)
+            wall.append((time.perf_counter() - t0) * 1000)
+            if args[0] == "-c":
+                continue
+            child.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        return min(wall), child
+
+    base, _ = best(["-c", "pass"])
+    print(f"Startup (best of {repeat}, interpreter start {base:.0f} ms subtracted)")
+    for mode in ("headless", "gui"):
+        wall, child = best([os.path.abspath(__file__), "--startup-child", mode])
+        if "error" in child[0]:
+            print(f"{mode:9s} unavailable: {child[0]['error']}")
+            continue
+        module_ms = min(c["module_ms"] for c in child)
+        rss = min(c["rss_kb"] for c in child)
+        print(f"{mode:9s} {wall - base:7.1f} ms load | {module_ms:6.1f} ms after stdlib | {rss / 1024:6.1f} MiB peak RSS")
+
 if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        sys.exit(bench_main())
+    if "--bench-reader" in sys.argv:
+        bench_reader_modes()
+        sys.exit(0)
+    if "--bench-sinks" in sys.argv:
+        bench_sinks()
+        sys.exit(0)
+    if "--bench-handoff" in sys.argv:
+        sys.exit(bench_handoff())
+    if "--bench-pads" in sys.argv:
+        bench_pads()
+        sys.exit(0)
+    if "--bench-filters" in sys.argv:
+        engine = MappingEngine()
+        engine.load_config()
+        bench_filters(engine.settings)
+        sys.exit(0)
+    if "--bench-ui" in sys.argv:
+        bench_ui()
+        sys.exit(0)
+    if "--bench-reload" in sys.argv:
+        bench_reload()
+        sys.exit(0)
+    if "--bench-startup" in sys.argv:
+        bench_startup()
+        sys.exit(0)
+    if "--startup-child" in sys.argv:
+        sys.exit(startup_child(cli_value("--startup-child", "headless")))
     if "--noui" in sys.argv or "-h" in sys.argv:
         app = HallMapperHeadless()
         app.run()
     else:
-        app = HallMapperApp()
-        app.mainloop()
+        run_gui()